@@ -1,29 +1,32 @@
 from typing import Optional
 
+UNSAFE_NOTE = "\nTahadhari: Ombi linaweza kuwa na vifaa visivyo salama; tafadhali kagua kabla ya kutekeleza."
+
 
 class EducationAdapter:
     def __init__(self, retriever, model):
         self.retriever = retriever
         self.model = model
 
-    def handle(self, message: str, context: dict):
-        # Use retrieved evidence passed via context if available
-        citations = context.get("evidence", [])
-        # Simple safety rule: flag unsafe materials keywords
-        unsafe_keywords = ["acid", "explosive", "knife"]
-        flagged = any(k.lower() in message.lower() for k in unsafe_keywords)
-
+    def _lesson_context(self, context: dict) -> dict:
         # Build lesson plan using model wrapper; include context params if provided
-        edu_ctx = {
+        return {
             "grade": context.get("grade") or context.get("grade_level"),
             "subject": context.get("subject"),
             "duration_minutes": context.get("duration_minutes", 30),
             "language": context.get("language", "sw"),
+            # generation budget: token cap and wall-clock seconds (model defaults when unset)
+            "max_new_tokens": context.get("max_new_tokens"),
+            "deadline_s": context.get("deadline_s"),
         }
-        reply = self.model.generate_lesson_plan(edu_ctx, citations)
-        if flagged:
-            reply += "\nTahadhari: Ombi linaweza kuwa na vifaa visivyo salama; tafadhali kagua kabla ya kutekeleza."
 
+    @staticmethod
+    def _flagged(message: str) -> bool:
+        # Simple safety rule: flag unsafe materials keywords
+        unsafe_keywords = ["acid", "explosive", "knife"]
+        return any(k.lower() in message.lower() for k in unsafe_keywords)
+
+    def _result(self, reply: str, citations: list, flagged: bool) -> dict:
         confidence = 0.6
         if citations:
             confidence = max(0.5, min(0.9, max(c.get("score", 0.0) for c in citations)))
@@ -34,3 +37,25 @@ class EducationAdapter:
             "citations": citations,
             "audit": {"action": "generate_lesson_plan", "flagged": flagged},
         }
+
+    def handle(self, message: str, context: dict):
+        # Use retrieved evidence passed via context if available
+        citations = context.get("evidence", [])
+        flagged = self._flagged(message)
+        reply = self.model.generate_lesson_plan(self._lesson_context(context), citations)
+        if flagged:
+            reply += UNSAFE_NOTE
+        return self._result(reply, citations, flagged)
+
+    def stream(self, message: str, context: dict):
+        """Yield ``token`` events while the plan is generated, then a ``done`` event with the full result."""
+        citations = context.get("evidence", [])
+        flagged = self._flagged(message)
+        parts = []
+        for piece in self.model.stream_lesson_plan(self._lesson_context(context), citations):
+            parts.append(piece)
+            yield {"event": "token", "data": piece}
+        if flagged:
+            parts.append(UNSAFE_NOTE)
+            yield {"event": "token", "data": UNSAFE_NOTE}
+        yield {"event": "done", "data": self._result("".join(parts), citations, flagged)}
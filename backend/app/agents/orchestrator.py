@@ -1,8 +1,14 @@
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, Optional
+
+# (query, domain, k) -> citation dicts as produced by rag.format_citations
+SearchFn = Callable[[str, str, int], List[Dict]]
+
 
 class AgentOrchestrator:
-    def __init__(self):
+    def __init__(self, search: Optional[SearchFn] = None, k: int = 4):
         self.adapters: Dict[str, object] = {}
+        self.search = search
+        self.k = k
 
     def register(self, name: str, adapter: object):
         self.adapters[name] = adapter
@@ -10,13 +16,48 @@ class AgentOrchestrator:
     def route(self, domain: str):
         return self.adapters.get(domain)
 
+    def _evidence(self, domain: str, message: str) -> List[Dict]:
+        if self.search is None or not message.strip():
+            return []
+        try:
+            return self.search(message, domain, self.k)
+        except Exception:
+            return []
+
+    @staticmethod
+    def _unsupported(domain: str) -> Dict:
+        return {
+            "reply": f"Unsupported domain: {domain}",
+            "confidence": 0.0,
+            "citations": [],
+            "audit": {"domain": domain, "status": "unsupported"},
+        }
+
+    def _with_evidence(self, domain: str, message: str, context: Dict) -> Dict:
+        # Retrieve against the domain's own partition unless the caller supplied evidence
+        if "evidence" not in context:
+            context = {**context, "evidence": self._evidence(domain, message)}
+        return context
+
     def handle(self, domain: str, message: str, context: Dict):
         adapter = self.route(domain)
         if not adapter:
-            return {
-                "reply": f"Unsupported domain: {domain}",
-                "confidence": 0.0,
-                "citations": [],
-                "audit": {"domain": domain, "status": "unsupported"},
-            }
-        return adapter.handle(message, context)
+            return self._unsupported(domain)
+        return adapter.handle(message, self._with_evidence(domain, message, context))
+
+    def stream(self, domain: str, message: str, context: Dict) -> Iterator[Dict]:
+        """Yield ``{"event": "token", "data": str}`` events, then one ``done`` event with the full result.
+
+        Adapters without a ``stream`` method produce their reply as a single token.
+        """
+        adapter = self.route(domain)
+        if not adapter:
+            result = self._unsupported(domain)
+        else:
+            context = self._with_evidence(domain, message, context)
+            if hasattr(adapter, "stream"):
+                yield from adapter.stream(message, context)
+                return
+            result = adapter.handle(message, context)
+        yield {"event": "token", "data": result.get("reply", "")}
+        yield {"event": "done", "data": result}
@@ -0,0 +1,172 @@
+import math
+import os
+from typing import Dict, Optional
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# Vector storage: float32, 8-bit scalar quantization, or product quantization codes
+QUANT_MODES = ("none", "sq8", "pq")
+# int8 storage scale for unit-normalised embeddings (components lie in [-1, 1])
+INT8_SCALE = 127.0
+
+
+def quant_mode() -> str:
+    mode = os.environ.get("K_SASA_RAG_QUANT", "none").lower()
+    return mode if mode in QUANT_MODES else "none"
+
+
+def quantize_vectors(vectors, mode: str):
+    """Convert vectors to the storage dtype for ``mode`` (int8 whenever quantization is on)."""
+    if mode == "none":
+        return np.asarray(dequantize_vectors(vectors), dtype="float32")
+    if getattr(vectors, "dtype", None) == np.int8:
+        return vectors
+    return np.clip(np.rint(np.asarray(vectors, dtype="float32") * INT8_SCALE), -127, 127).astype("int8")
+
+
+def dequantize_vectors(vectors):
+    if getattr(vectors, "dtype", None) == np.int8:
+        return np.asarray(vectors, dtype="float32") / INT8_SCALE
+    return np.asarray(vectors, dtype="float32")
+
+
+def ann_params() -> Dict:
+    """Index tuning knobs, read from the environment."""
+    return {
+        "nprobe": int(os.environ.get("K_SASA_RAG_NPROBE", "16")),
+        "ef_search": int(os.environ.get("K_SASA_RAG_EF_SEARCH", "64")),
+        "ef_construction": int(os.environ.get("K_SASA_RAG_EF_CONSTRUCTION", "80")),
+        "hnsw_m": int(os.environ.get("K_SASA_RAG_HNSW_M", "32")),
+        "pq_m": int(os.environ.get("K_SASA_RAG_PQ_M", "16")),
+        "train_sample": int(os.environ.get("K_SASA_RAG_TRAIN_SAMPLE", "50000")),
+        # auto mode: exact scan below flat_max, HNSW below hnsw_max, IVF-PQ above
+        "flat_max": int(os.environ.get("K_SASA_RAG_FLAT_MAX", "20000")),
+        "hnsw_max": int(os.environ.get("K_SASA_RAG_HNSW_MAX", "1000000")),
+    }
+
+
+def resolve_index_type(requested: str, n: int, params: Optional[Dict] = None) -> str:
+    """Pick a concrete index type for ``n`` vectors; ``auto`` chooses by corpus size."""
+    params = params or ann_params()
+    requested = (requested or "auto").lower()
+    if requested == "auto":
+        if n <= params["flat_max"]:
+            return "flat"
+        if n <= params["hnsw_max"]:
+            return "hnsw"
+        return "ivf_pq"
+    if requested not in INDEX_TYPES:
+        return "flat"
+    # IVF needs enough points to train its coarse quantizer (and PQ its 256 centroids per sub-space)
+    if requested == "ivf_pq" and n < 256 * 39:
+        requested = "ivf_flat"
+    if requested == "ivf_flat" and n < 39 * 4:
+        requested = "flat"
+    return requested
+
+
+def _nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, with at least 39 training points per centroid
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m(dim: int, wanted: int) -> int:
+    for m in range(min(wanted, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _train_sample(vectors, size: int):
+    if len(vectors) <= size:
+        return np.ascontiguousarray(vectors, dtype="float32")
+    rows = np.sort(np.random.default_rng(0).choice(len(vectors), size=size, replace=False))
+    return np.ascontiguousarray(vectors[rows], dtype="float32")
+
+
+# Recorded in snapshot manifests; sq8 indexes saved without it used seed-trained ranges
+SQ_RANGE = "unit"
+
+
+def _unit_range(sq, dim: int):
+    # Embeddings are L2-normalised, so every component lies in [-1, 1]. A fixed range
+    # (instead of min/max trained on the seed corpus) keeps vectors added later from clipping.
+    faiss.copy_array_to_vector(
+        np.concatenate([np.full(dim, -1.0), np.full(dim, 2.0)]).astype("float32"), sq.trained
+    )
+
+
+def build_ann_index(vectors, ids, index_type: str, params: Optional[Dict] = None, quant: str = "none"):
+    """Build an ID-mapped inner-product index of ``index_type`` over float32 ``vectors``.
+
+    ``quant`` swaps the float32 codes for 8-bit scalar (sq8) or product (pq)
+    quantized ones; PQ needs ~10k vectors to train and falls back to sq8 below that.
+    """
+    params = params or ann_params()
+    n, dim = vectors.shape
+    ip = faiss.METRIC_INNER_PRODUCT
+    if quant == "pq" and n < 256 * 39:
+        quant = "sq8"
+    qt8 = faiss.ScalarQuantizer.QT_8bit
+    pq_m = _pq_m(dim, params["pq_m"])
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        if quant == "pq":
+            base = faiss.IndexIVFPQ(quantizer, dim, _nlist(n), pq_m, 8, ip)
+        elif quant == "sq8":
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, _nlist(n), qt8, ip)
+            base.by_residual = False  # encode the vectors themselves, which stay within the unit range
+        else:
+            base = faiss.IndexIVFFlat(quantizer, dim, _nlist(n), ip)
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, _nlist(n), pq_m, 8, ip)
+    elif index_type == "hnsw":
+        if quant == "pq":
+            base = faiss.IndexHNSWPQ(dim, pq_m, params["hnsw_m"], 8, ip)
+        elif quant == "sq8":
+            base = faiss.IndexHNSWSQ(dim, qt8, params["hnsw_m"], ip)
+        else:
+            base = faiss.IndexHNSWFlat(dim, params["hnsw_m"], ip)
+        base.hnsw.efConstruction = params["ef_construction"]
+    elif quant == "pq":
+        base = faiss.IndexPQ(dim, pq_m, 8, ip)
+    elif quant == "sq8":
+        base = faiss.IndexScalarQuantizer(dim, qt8, ip)
+    else:
+        base = faiss.IndexFlatIP(dim)
+    if not base.is_trained:
+        base.train(_train_sample(vectors, params["train_sample"]))
+    if quant == "sq8":
+        sq = faiss.downcast_index(base.storage).sq if index_type == "hnsw" else base.sq
+        _unit_range(sq, dim)
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+    set_search_params(index, params)
+    return index
+
+
+def set_search_params(index, params: Optional[Dict] = None):
+    """Apply nprobe / efSearch to an index (also needed after reading one from disk)."""
+    params = params or ann_params()
+    try:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = min(params["nprobe"], ivf.nlist)
+            return
+    except Exception:
+        pass
+    try:
+        base = faiss.downcast_index(index.index if hasattr(index, "id_map") else index)
+        if hasattr(base, "hnsw"):
+            base.hnsw.efSearch = params["ef_search"]
+    except Exception:
+        pass
@@ -0,0 +1,104 @@
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over chunk rows.
+
+    Postings hold parallel row / term-frequency arrays per term; document
+    frequencies and lengths are kept up to date on add/remove, so a query only
+    touches the postings of its own terms. Removed rows stay in the postings
+    until the index is rebuilt and are skipped at query time (length -1).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (rows, term frequencies); arrays instead of tuples keep edge-node memory low
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.df: Dict[str, int] = {}
+        self.doc_len = array("i")  # indexed by row; -1 marks absent rows
+        self.n_docs = 0
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def _length(self, row: int) -> int:
+        return self.doc_len[row] if row < len(self.doc_len) else -1
+
+    def add(self, row: int, text: str):
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        if row >= len(self.doc_len):
+            self.doc_len.extend([-1] * (row + 1 - len(self.doc_len)))
+        self.doc_len[row] = length
+        self.n_docs += 1
+        self.total_len += length
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("i"), array("i"))
+            posting[0].append(row)
+            posting[1].append(tf)
+            self.df[term] = self.df.get(term, 0) + 1
+
+    def remove(self, row: int, text: str):
+        length = self._length(row)
+        if length < 0:
+            return
+        self.doc_len[row] = -1
+        self.n_docs -= 1
+        self.total_len -= length
+        for term in set(tokenize(text)):
+            left = self.df.get(term, 0) - 1
+            if left > 0:
+                self.df[term] = left
+            else:
+                self.df.pop(term, None)
+                self.postings.pop(term, None)
+
+    def idf(self, term: str) -> float:
+        n = self.n_docs
+        df = self.df.get(term, 0)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int, exclude: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Return the top-k (row, score) pairs; scores are normalised to [0, 1]."""
+        terms = set(tokenize(query))
+        if not terms or not self.n_docs:
+            return []
+        avg_len = self.total_len / float(self.n_docs) or 1.0
+        scores: Dict[int, float] = {}
+        best_possible = 0.0
+        for term in terms:
+            idf = self.idf(term)
+            best_possible += idf * (self.k1 + 1.0)
+            rows, tfs = self.postings.get(term, ((), ()))
+            for row, tf in zip(rows, tfs):
+                length = self.doc_len[row]
+                if length < 0 or (exclude and row in exclude):
+                    continue
+                norm = self.k1 * (1.0 - self.b + self.b * length / avg_len)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        if not scores:
+            return []
+        top = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+        return [(row, s / (best_possible or 1.0)) for row, s in top]
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, str]]) -> "BM25Index":
+        index = cls()
+        for row, text in rows:
+            index.add(row, text)
+        return index
@@ -0,0 +1,86 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.bm25 import tokenize
+
+BITS = 64
+BANDS = 4
+_BAND_BITS = BITS // BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in few bits."""
+    tokens = tokenize(text)
+    if len(tokens) >= shingle:
+        features = [" ".join(tokens[i : i + shingle]) for i in range(len(tokens) - shingle + 1)]
+    else:
+        features = tokens
+    if not features:
+        return 0
+    weights = [0] * BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    out = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            out |= 1 << bit
+    return out
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """Banded SimHash lookup of rows within ``max_bits`` Hamming distance.
+
+    With ``max_bits`` < BANDS, any two hashes within the distance share at
+    least one identical band, so only rows in matching band buckets are compared.
+    """
+
+    def __init__(self, max_bits: int = 3):
+        self.max_bits = min(max_bits, BANDS - 1)
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self.hashes: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @staticmethod
+    def _bands(h: int) -> Iterable[Tuple[int, int]]:
+        for band in range(BANDS):
+            yield band, (h >> (band * _BAND_BITS)) & _BAND_MASK
+
+    def add(self, row: int, h: int):
+        self.hashes[row] = h
+        for band, key in self._bands(h):
+            self.buckets[band].setdefault(key, []).append(row)
+
+    def remove(self, row: int):
+        h = self.hashes.pop(row, None)
+        if h is None:
+            return
+        for band, key in self._bands(h):
+            bucket = self.buckets[band].get(key)
+            if bucket and row in bucket:
+                bucket.remove(row)
+                if not bucket:
+                    del self.buckets[band][key]
+
+    def find(self, h: int) -> Optional[int]:
+        best: Optional[Tuple[int, int]] = None
+        for band, key in self._bands(h):
+            for row in self.buckets[band].get(key, ()):
+                d = hamming(h, self.hashes[row])
+                if d <= self.max_bits and (best is None or d < best[0]):
+                    best = (d, row)
+                    if d == 0:
+                        return row
+        return best[1] if best else None
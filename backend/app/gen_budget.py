@@ -0,0 +1,87 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+# Headings of a complete lesson plan, in order
+LESSON_SECTIONS = ("Malengo ya Kujifunza", "Vifaa", "Shughuli", "Tathmini")
+
+
+@dataclass
+class GenerationBudget:
+    """Per-request generation limits.
+
+    ``deadline`` is an absolute ``time.monotonic()`` value, so time spent
+    waiting for a batch counts against it. Generation also stops once every
+    heading in ``stop_sections`` has appeared and the last section has ended.
+    """
+
+    max_new_tokens: int = 600
+    deadline: Optional[float] = None
+    stop_sections: Tuple[str, ...] = field(default_factory=tuple)
+
+    @classmethod
+    def from_context(cls, context: dict, stop_sections: Sequence[str] = ()) -> "GenerationBudget":
+        max_new = context.get("max_new_tokens") or int(os.environ.get("K_SASA_GEN_MAX_NEW_TOKENS", "600"))
+        deadline_s = context.get("deadline_s")
+        if deadline_s is None:
+            deadline_s = float(os.environ.get("K_SASA_GEN_DEADLINE_S", "30"))
+        return cls(
+            max_new_tokens=max(1, int(max_new)),
+            deadline=time.monotonic() + float(deadline_s) if deadline_s and float(deadline_s) > 0 else None,
+            stop_sections=tuple(stop_sections),
+        )
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+
+def sections_complete(text: str, sections: Sequence[str]) -> bool:
+    """True once every heading appears in order and the last one is followed by a finished paragraph."""
+    if not sections:
+        return False
+    low = text.lower()
+    pos = 0
+    for name in sections:
+        i = low.find(name.lower(), pos)
+        if i < 0:
+            return False
+        pos = i + len(name)
+    tail = text[pos:].lstrip(" :*#\n")
+    return bool(tail) and "\n\n" in tail
+
+
+def budget_criteria(tokenizer, budgets: List[GenerationBudget], check_every: int = 4):
+    """A per-row StoppingCriteria enforcing each request's token budget, deadline and section stop.
+
+    ``reasons[i]`` records why row ``i`` stopped ("budget", "deadline" or
+    "sections"); rows that end on EOS keep ``None``.
+    """
+    import torch  # type: ignore
+    from transformers import StoppingCriteria  # type: ignore
+
+    class _BudgetCriteria(StoppingCriteria):
+        def __init__(self):
+            self.start: Optional[int] = None
+            self.reasons: List[Optional[str]] = [None] * len(budgets)
+
+        def __call__(self, input_ids, scores, **kwargs):
+            if self.start is None:
+                self.start = input_ids.shape[1] - 1
+            generated = input_ids.shape[1] - self.start
+            now = time.monotonic()
+            done = []
+            for row, budget in enumerate(budgets):
+                if self.reasons[row] is None:
+                    if generated >= budget.max_new_tokens:
+                        self.reasons[row] = "budget"
+                    elif budget.deadline is not None and now >= budget.deadline:
+                        self.reasons[row] = "deadline"
+                    elif budget.stop_sections and generated % check_every == 0:
+                        text = tokenizer.decode(input_ids[row, self.start :], skip_special_tokens=True)
+                        if sections_complete(text, budget.stop_sections):
+                            self.reasons[row] = "sections"
+                done.append(self.reasons[row] is not None)
+            return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    return _BudgetCriteria()
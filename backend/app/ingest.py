@@ -0,0 +1,106 @@
+import os
+import re
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def chunk_params() -> dict:
+    return {
+        "max_tokens": int(os.environ.get("K_SASA_RAG_CHUNK_TOKENS", "120")),
+        "overlap_tokens": int(os.environ.get("K_SASA_RAG_CHUNK_OVERLAP", "20")),
+        "embed_batch": int(os.environ.get("K_SASA_RAG_EMBED_BATCH", "64")),
+    }
+
+
+def chunker_id(params: dict) -> str:
+    """Identifies the chunking scheme; persisted indexes built with another scheme are re-chunked."""
+    return f"sentences-{params['max_tokens']}-{params['overlap_tokens']}"
+
+
+def iter_file_blocks(path: str, block_size: int = 1 << 16) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            yield block
+
+
+def iter_sentences(blocks: Iterable[str], max_chars: int = 4096) -> Iterator[str]:
+    """Split a stream of text blocks into sentences without joining the blocks.
+
+    A run longer than ``max_chars`` with no sentence boundary is cut at the
+    last whitespace so the carry-over buffer stays bounded.
+    """
+    buf = ""
+    for block in blocks:
+        buf += block
+        parts = _SENTENCE_END.split(buf)
+        buf = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+        while len(buf) > max_chars:
+            cut = buf.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if buf[:cut].strip():
+                yield buf[:cut].strip()
+            buf = buf[cut:]
+    if buf.strip():
+        yield buf.strip()
+
+
+def iter_chunks(sentences: Iterable[str], max_tokens: int = 120, overlap_tokens: int = 20) -> Iterator[str]:
+    """Pack whole sentences into chunks of at most ``max_tokens`` whitespace tokens.
+
+    Consecutive chunks share up to ``overlap_tokens`` tokens of trailing
+    sentences; a sentence longer than ``max_tokens`` is split on word boundaries.
+    """
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    window: List[List[str]] = []
+    size = 0
+    fresh = False  # window holds tokens not yet emitted
+
+    def emit():
+        return " ".join(" ".join(words) for words in window)
+
+    for sentence in sentences:
+        words = sentence.split()
+        while len(words) > max_tokens:
+            head, words = words[:max_tokens], words[max_tokens:]
+            if fresh:
+                yield emit()
+            window, size, fresh = [], 0, False
+            yield " ".join(head)
+        if not words:
+            continue
+        if size + len(words) > max_tokens and fresh:
+            yield emit()
+            # keep trailing sentences that fit in the overlap budget
+            kept: List[List[str]] = []
+            kept_size = 0
+            for prev in reversed(window):
+                if kept_size + len(prev) > overlap_tokens:
+                    break
+                kept.insert(0, prev)
+                kept_size += len(prev)
+            window, size = kept, kept_size
+        while window and size + len(words) > max_tokens:
+            size -= len(window.pop(0))
+        window.append(words)
+        size += len(words)
+        fresh = True
+    if fresh:
+        yield emit()
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,39 +1,59 @@
+import copy
+import hashlib
+import json
 import os
-import torch
-import torch.nn as nn
-from torch.nn.utils.rnn import pad_sequence
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# torch is imported on first use (see _import_torch) so importing this module stays cheap
+torch = None
+nn = None
 
 # Token IDs must match training script
 PAD, BOS, EOS, UNK = 0, 1, 2, 3
 
+Encoder = None
+Decoder = None
+
+
+def _import_torch():
+    """Import torch and define the model classes; called before any model use."""
+    global torch, nn, Encoder, Decoder, _device
+    if torch is not None:
+        return
+    import torch as _torch
+    import torch.nn as _nn
 
-class Encoder(nn.Module):
-    def __init__(self, vocab_size, emb_dim=128, hid_dim=256):
-        super().__init__()
-        self.emb = nn.Embedding(vocab_size, emb_dim, padding_idx=PAD)
-        self.gru = nn.GRU(emb_dim, hid_dim, batch_first=True)
+    class _Encoder(_nn.Module):
+        def __init__(self, vocab_size, emb_dim=128, hid_dim=256):
+            super().__init__()
+            self.emb = _nn.Embedding(vocab_size, emb_dim, padding_idx=PAD)
+            self.gru = _nn.GRU(emb_dim, hid_dim, batch_first=True)
 
-    def forward(self, x, lengths):
-        emb = self.emb(x)
-        packed = nn.utils.rnn.pack_padded_sequence(
-            emb, lengths, batch_first=True, enforce_sorted=False
-        )
-        _, h = self.gru(packed)
-        return h
+        def forward(self, x, lengths):
+            emb = self.emb(x)
+            packed = _nn.utils.rnn.pack_padded_sequence(
+                emb, lengths, batch_first=True, enforce_sorted=False
+            )
+            _, h = self.gru(packed)
+            return h
 
+    class _Decoder(_nn.Module):
+        def __init__(self, vocab_size, emb_dim=128, hid_dim=256):
+            super().__init__()
+            self.emb = _nn.Embedding(vocab_size, emb_dim, padding_idx=PAD)
+            self.gru = _nn.GRU(emb_dim, hid_dim, batch_first=True)
+            self.fc = _nn.Linear(hid_dim, vocab_size)
 
-class Decoder(nn.Module):
-    def __init__(self, vocab_size, emb_dim=128, hid_dim=256):
-        super().__init__()
-        self.emb = nn.Embedding(vocab_size, emb_dim, padding_idx=PAD)
-        self.gru = nn.GRU(emb_dim, hid_dim, batch_first=True)
-        self.fc = nn.Linear(hid_dim, vocab_size)
+        def forward(self, y_prev, h):
+            emb = self.emb(y_prev)
+            out, h = self.gru(emb, h)
+            logits = self.fc(out)
+            return logits, h
 
-    def forward(self, y_prev, h):
-        emb = self.emb(y_prev)
-        out, h = self.gru(emb, h)
-        logits = self.fc(out)
-        return logits, h
+    Encoder, Decoder, nn = _Encoder, _Decoder, _nn
+    _device = _torch.device("cpu")
+    torch = _torch
 
 
 def _encode_sentence(s, stoi, add_bos=False, add_eos=True):
@@ -48,46 +68,305 @@ def _encode_sentence(s, stoi, add_bos=False, add_eos=True):
 _model_loaded = False
 _enc = None
 _dec = None
+_eager = None  # (encoder, decoder) float32 modules from the checkpoint
+_variant = None
+_tgt_vocab = 0
 _src_stoi = None
 _tgt_itos = None
-_device = torch.device("cpu")
+_device = None
+_load_lock = threading.Lock()
+
+# eager/quantized are built in memory; scripted variants are loaded from exported TorchScript files
+VARIANTS = ("eager", "quantized", "scripted", "scripted_int8")
+ARTIFACT_VARIANTS = ("scripted", "scripted_int8")
+BENCH_MANIFEST = "translator_bench.json"
+
+# Upper bounds on per-request decoding options
+MAX_BEAM = int(os.environ.get("K_SASA_TRANSLATE_MAX_BEAM", "8"))
+MAX_DECODE_LEN = int(os.environ.get("K_SASA_TRANSLATE_MAX_LEN", "128"))
+
+
+def model_dir() -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(base_dir, "..", "kiswahili-model-local"))
 
 
 def _load_model():
-    global _model_loaded, _enc, _dec, _src_stoi, _tgt_itos
     if _model_loaded:
         return
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    ckpt_path = os.path.normpath(os.path.join(base_dir, "..", "kiswahili-model-local", "model.pt"))
+    with _load_lock:
+        if not _model_loaded:
+            _import_torch()
+            _load_checkpoint()
+
+
+def _load_checkpoint():
+    global _model_loaded, _eager, _tgt_vocab, _src_stoi, _tgt_itos
+    ckpt_path = os.path.join(model_dir(), "model.pt")
     if not os.path.exists(ckpt_path):
         raise RuntimeError(f"Kiswahili model checkpoint not found at {ckpt_path}")
     ckpt = torch.load(ckpt_path, map_location=_device)
     _src_stoi = ckpt["src_stoi"]
     tgt_stoi = ckpt["tgt_stoi"]
     _tgt_itos = ckpt["tgt_itos"]
-    _enc = Encoder(len(_src_stoi)).to(_device)
-    _dec = Decoder(len(tgt_stoi)).to(_device)
-    _enc.load_state_dict(ckpt["enc"])
-    _dec.load_state_dict(ckpt["dec"])
-    _enc.eval()
-    _dec.eval()
+    _tgt_vocab = len(tgt_stoi)
+    enc = Encoder(len(_src_stoi)).to(_device)
+    dec = Decoder(len(tgt_stoi)).to(_device)
+    enc.load_state_dict(ckpt["enc"])
+    dec.load_state_dict(ckpt["dec"])
+    enc.eval()
+    dec.eval()
+    _eager = (enc, dec)
+    try:
+        _activate(_select_variant())
+    except Exception:
+        _activate("eager")
     _model_loaded = True
 
 
-def translate(text: str, max_len: int = 20) -> str:
-    """Translate a Swahili sentence to English using the tiny local GRU model."""
+def checkpoint_fingerprint() -> str:
+    digest = hashlib.sha256()
+    with open(os.path.join(model_dir(), "model.pt"), "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def artifact_paths(variant: str, out_dir: Optional[str] = None) -> Tuple[str, str]:
+    out_dir = out_dir or model_dir()
+    return os.path.join(out_dir, f"encoder.{variant}.pt"), os.path.join(out_dir, f"decoder.{variant}.pt")
+
+
+def _quantize(module):
+    # int8 weights for the GRU and output projection; activations stay float
+    return torch.ao.quantization.quantize_dynamic(module, {nn.GRU, nn.Linear}, dtype=torch.qint8)
+
+
+def build_variant(variant: str):
+    """(encoder, decoder) for ``variant``, derived from the eager checkpoint modules."""
+    if variant not in VARIANTS:
+        raise ValueError(f"unknown translator variant {variant!r}")
+    enc, dec = _eager
+    if variant in ("quantized", "scripted_int8"):
+        enc, dec = _quantize(copy.deepcopy(enc)), _quantize(copy.deepcopy(dec))
+    if variant in ARTIFACT_VARIANTS:
+        enc, dec = torch.jit.script(enc), torch.jit.script(dec)
+    return enc, dec
+
+
+def export_artifacts(variants=ARTIFACT_VARIANTS, out_dir: Optional[str] = None) -> Dict[str, Tuple[str, str]]:
+    """Write TorchScript encoder/decoder files for each scripted variant; returns their paths."""
     _load_model()
-    with torch.no_grad():
-        src = _encode_sentence(text.lower(), _src_stoi, add_bos=False, add_eos=True).unsqueeze(0).to(_device)
-        lengths = torch.tensor([src.size(1)], device=_device)
-        h = _enc(src, lengths).contiguous()
-        y = torch.tensor([[BOS]], dtype=torch.long, device=_device)
-        out_tokens = []
-        for _ in range(max_len):
-            logits, h = _dec(y, h)
-            next_tok = logits[:, -1].argmax(-1)
-            if next_tok.item() in (EOS, PAD):
+    written = {}
+    for variant in variants:
+        if variant not in ARTIFACT_VARIANTS:
+            continue
+        enc, dec = build_variant(variant)
+        paths = artifact_paths(variant, out_dir)
+        torch.jit.save(enc, paths[0])
+        torch.jit.save(dec, paths[1])
+        written[variant] = paths
+    return written
+
+
+def _variant_modules(variant: str):
+    if variant in ARTIFACT_VARIANTS:
+        enc_path, dec_path = artifact_paths(variant)
+        if os.path.exists(enc_path) and os.path.exists(dec_path):
+            enc = torch.jit.load(enc_path, map_location=_device)
+            dec = torch.jit.load(dec_path, map_location=_device)
+            return enc.eval(), dec.eval()
+    return build_variant(variant)
+
+
+def _activate(variant: str):
+    global _enc, _dec, _variant
+    _enc, _dec = _variant_modules(variant)
+    _variant = variant
+
+
+def _select_variant() -> str:
+    """K_SASA_TRANSLATE_VARIANT, or with "auto" the fastest benchmarked variant that agrees with eager."""
+    requested = os.environ.get("K_SASA_TRANSLATE_VARIANT", "auto").strip().lower()
+    if requested != "auto":
+        return requested if requested in VARIANTS else "eager"
+    try:
+        with open(os.path.join(model_dir(), BENCH_MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception:
+        return "eager"
+    if manifest.get("checkpoint") != checkpoint_fingerprint():
+        return "eager"  # benchmark (and any exported files) predate the current checkpoint
+    min_agreement = float(os.environ.get("K_SASA_TRANSLATE_MIN_AGREEMENT", "0.98"))
+    usable = [
+        r
+        for r in manifest.get("results", [])
+        if r.get("variant") in VARIANTS
+        and r.get("agreement", 0.0) >= min_agreement
+        and (r["variant"] not in ARTIFACT_VARIANTS or all(map(os.path.exists, artifact_paths(r["variant"]))))
+    ]
+    if not usable:
+        return "eager"
+    return min(usable, key=lambda r: r.get("p50_ms", float("inf")))["variant"]
+
+
+def use_variant(variant: str) -> str:
+    """Switch translation to ``variant`` (see VARIANTS); returns the active variant."""
+    _load_model()
+    with _load_lock:
+        _activate(variant)
+    return _variant
+
+
+def is_loaded() -> bool:
+    return _model_loaded
+
+
+def info() -> Dict[str, Any]:
+    return {"loaded": _model_loaded, "variant": _variant}
+
+
+def warm() -> bool:
+    """Load the checkpoint ahead of the first request; False if torch or the checkpoint is unavailable."""
+    try:
+        _load_model()
+    except Exception:
+        return False
+    return True
+
+
+def _decode_limits(src_lengths, max_len: Optional[int]):
+    """Per-row decoding step limits: fixed ``max_len``, or proportional to the source length; at most MAX_DECODE_LEN."""
+    if max_len is not None:
+        return torch.full_like(src_lengths, min(max(1, int(max_len)), MAX_DECODE_LEN))
+    ratio = float(os.environ.get("K_SASA_TRANSLATE_LEN_RATIO", "2.0"))
+    extra = int(os.environ.get("K_SASA_TRANSLATE_LEN_EXTRA", "4"))
+    return ((src_lengths.float() * ratio).ceil().long() + extra).clamp(max=MAX_DECODE_LEN)
+
+
+def _strip(rows: List[List[int]]) -> List[List[int]]:
+    out = []
+    for row in rows:
+        toks = []
+        for t in row:
+            if t in (EOS, PAD):
                 break
-            out_tokens.append(next_tok.item())
-            y = torch.cat([y, next_tok.unsqueeze(0)], dim=1)
-        return " ".join(_tgt_itos.get(t, "") for t in out_tokens if t in _tgt_itos)
+            toks.append(t)
+        out.append(toks)
+    return out
+
+
+def _greedy_decode(dec, h, limits) -> List[List[int]]:
+    """Greedy decoding of all rows in parallel.
+
+    Each step feeds only the previous token with the carried GRU state; rows
+    that emitted EOS/PAD or reached their step limit are masked to PAD, and
+    the loop ends once all rows have finished. Tokens stay on the device until
+    one final transfer.
+    """
+    batch = limits.size(0)
+    y = torch.full((batch, 1), BOS, dtype=torch.long, device=_device)
+    finished = torch.zeros(batch, dtype=torch.bool, device=_device)
+    steps = []
+    for t in range(int(limits.max())):
+        logits, h = dec(y, h)
+        next_tok = logits[:, -1].argmax(-1).masked_fill(finished, PAD)
+        steps.append(next_tok)
+        finished |= (next_tok == EOS) | (next_tok == PAD) | (limits <= t + 1)
+        if bool(finished.all()):
+            break
+        y = next_tok.unsqueeze(1)
+    return _strip(torch.stack(steps, dim=1).tolist() if steps else [[] for _ in range(batch)])
+
+
+def _length_norm(lengths, alpha: float):
+    # GNMT length penalty; alpha=0 ranks by raw log-probability
+    return ((5.0 + lengths.float()) / 6.0) ** alpha
+
+
+def _beam_decode(dec, h, limits, beam_size: int, alpha: float) -> List[List[int]]:
+    """Beam search over ``batch x beam_size`` hypotheses as batched tensor ops.
+
+    Hypotheses are ranked by length-normalized log-probability. Finished
+    beams only extend with PAD at no cost, so they keep their score and
+    length; decoding stops once every beam of every row has finished.
+    """
+    batch, vocab = limits.size(0), _tgt_vocab
+    k = max(1, min(beam_size, vocab))
+    neg_inf = float("-inf")
+    h = h.repeat_interleave(k, dim=1)  # (1, batch*k, hid)
+    scores = torch.full((batch, k), neg_inf, device=_device)
+    scores[:, 0] = 0.0  # all beams start identical; expand from the first only
+    lengths = torch.zeros(batch, k, dtype=torch.long, device=_device)
+    finished = torch.zeros(batch, k, dtype=torch.bool, device=_device)
+    tokens = torch.empty(batch, k, 0, dtype=torch.long, device=_device)
+    y = torch.full((batch * k, 1), BOS, dtype=torch.long, device=_device)
+    pad_only = torch.full((vocab,), neg_inf, device=_device)
+    pad_only[PAD] = 0.0
+    rows = torch.arange(batch, device=_device).unsqueeze(1)
+    for t in range(int(limits.max())):
+        logits, h = dec(y, h)
+        logp = torch.log_softmax(logits[:, -1], dim=-1).view(batch, k, vocab)
+        logp[..., PAD] = neg_inf
+        logp = torch.where(finished.unsqueeze(-1), pad_only, logp)
+        cand = (scores.unsqueeze(-1) + logp).view(batch, k * vocab)
+        cand_len = (lengths + (~finished).long()).unsqueeze(-1).expand(batch, k, vocab).reshape(batch, k * vocab)
+        _, idx = (cand / _length_norm(cand_len, alpha)).topk(k, dim=-1)
+        beam, tok = idx // vocab, idx % vocab
+        scores = cand.gather(1, idx)
+        lengths = cand_len.gather(1, idx)
+        tokens = torch.cat([tokens[rows, beam], tok.unsqueeze(-1)], dim=-1)
+        finished = finished[rows, beam] | (tok == EOS) | (limits <= t + 1).unsqueeze(1)
+        h = h.view(1, batch, k, -1)[:, rows, beam].reshape(1, batch * k, -1).contiguous()
+        if bool(finished.all()):
+            break
+        y = tok.view(batch * k, 1)
+    best = (scores / _length_norm(lengths, alpha)).argmax(-1)
+    return _strip(tokens[rows.squeeze(1), best].tolist())
+
+
+def _detokenize(tokens: List[int]) -> str:
+    return " ".join(_tgt_itos.get(t, "") for t in tokens if t in _tgt_itos)
+
+
+def translate_batch(
+    texts: List[str],
+    max_len: Optional[int] = None,
+    beam_size: Optional[int] = None,
+    length_penalty: Optional[float] = None,
+    batch_size: int = 64,
+) -> List[str]:
+    """Translate many Swahili sentences, padding them into batches decoded in parallel.
+
+    ``beam_size`` > 1 selects beam search (default from K_SASA_TRANSLATE_BEAM,
+    greedy when unset). ``max_len`` caps the output length; by default it
+    scales with each source sentence.
+    """
+    _load_model()
+    if beam_size is None:
+        beam_size = int(os.environ.get("K_SASA_TRANSLATE_BEAM", "1"))
+    beam_size = min(beam_size, MAX_BEAM)
+    if length_penalty is None:
+        length_penalty = float(os.environ.get("K_SASA_TRANSLATE_LENGTH_PENALTY", "0.6"))
+    enc, dec = _enc, _dec
+    results: List[str] = []
+    with torch.no_grad():
+        for i in range(0, len(texts), batch_size):
+            chunk = [_encode_sentence(t.lower(), _src_stoi, add_bos=False, add_eos=True) for t in texts[i : i + batch_size]]
+            lengths = torch.tensor([len(c) for c in chunk])  # stays on CPU for pack_padded_sequence
+            src = nn.utils.rnn.pad_sequence(chunk, batch_first=True, padding_value=PAD).to(_device)
+            h = enc(src, lengths).contiguous()
+            limits = _decode_limits(lengths - 1, max_len).to(_device)
+            if beam_size > 1:
+                decoded = _beam_decode(dec, h, limits, beam_size, length_penalty)
+            else:
+                decoded = _greedy_decode(dec, h, limits)
+            results.extend(_detokenize(toks) for toks in decoded)
+    return results
+
+
+def translate(
+    text: str, max_len: Optional[int] = None, beam_size: Optional[int] = None, length_penalty: Optional[float] = None
+) -> str:
+    """Translate a Swahili sentence to English using the tiny local GRU model."""
+    return translate_batch([text], max_len=max_len, beam_size=beam_size, length_penalty=length_penalty)[0]
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+try:
+    import httpx  # type: ignore
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+
+def available() -> bool:
+    return httpx is not None
+
+
+class BackendPool:
+    """Shared keep-alive HTTP client and concurrency limit for one LLM backend.
+
+    At most ``concurrency`` requests are in flight; further callers wait on
+    the semaphore without holding a worker thread. The client and semaphore
+    are created on first use, inside the serving event loop.
+    """
+
+    def __init__(self, name: str, concurrency: int, timeout_s: float, connect_timeout_s: float = 5.0):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.timeout_s = float(timeout_s)
+        self.connect_timeout_s = float(connect_timeout_s)
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout_s, connect=self.connect_timeout_s),
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _acquire(self):
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        """POST ``payload`` and return the response (status is not checked)."""
+        await self._acquire()
+        try:
+            return await self.client.post(url, json=payload, headers=headers)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+
+    async def stream_lines(
+        self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[str]:
+        """POST ``payload`` and yield response lines as they arrive; the slot is held until the stream ends."""
+        await self._acquire()
+        try:
+            async with self.client.stream("POST", url, json=payload, headers=headers) as resp:
+                if resp.status_code != 200:
+                    body = (await resp.aread()).decode("utf-8", "replace")
+                    raise RuntimeError(f"HTTP {resp.status_code}: {body}")
+                async for line in resp.aiter_lines():
+                    if line:
+                        yield line
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+
+    async def run_in_thread(self, func, *args):
+        """Run a blocking client call in a worker thread, within the same concurrency limit."""
+        await self._acquire()
+        try:
+            return await asyncio.to_thread(func, *args)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+
+    async def iterate_in_thread(self, iterator: Iterator[str]) -> AsyncIterator[str]:
+        """Drive a blocking stream from worker threads; the slot is held until the stream ends."""
+        await self._acquire()
+        try:
+            async for item in iterate_in_thread(iterator):
+                yield item
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+POOLS: Dict[str, BackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> BackendPool:
+    """Pool for backend ``name``; limits come from K_SASA_<NAME>_CONCURRENCY / _TIMEOUT."""
+    pool = POOLS.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = POOLS.get(name)
+            if pool is None:
+                prefix = f"K_SASA_{name.upper()}"
+                pool = POOLS[name] = BackendPool(
+                    name,
+                    concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", "8")),
+                    timeout_s=float(os.environ.get(f"{prefix}_TIMEOUT", "60")),
+                )
+    return pool
+
+
+async def aclose_all():
+    for pool in list(POOLS.values()):
+        await pool.aclose()
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in POOLS.items()}
+
+
+async def iterate_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """Drive a blocking iterator from a worker thread (fallback when httpx is not installed)."""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            break
+        yield item
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+AskFn = Callable[[str], Awaitable[Dict[str, Any]]]
+StreamFn = Callable[[str], AsyncIterator[str]]
+
+POLICIES = ("priority", "fastest")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BackendHealth:
+    """Rolling latency / error window and circuit breaker for one backend.
+
+    After ``failures`` consecutive errors the circuit opens for ``cooldown_s``;
+    then a single probe request is let through (half-open), and its outcome
+    closes or re-opens the circuit.
+    """
+
+    def __init__(self, window: int = 100, failures: int = 5, cooldown_s: float = 30.0):
+        self.samples: deque = deque(maxlen=window)  # (latency_s, ok)
+        self.failure_threshold = max(1, failures)
+        self.cooldown_s = cooldown_s
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probe_started = 0.0
+
+    def record(self, latency_s: float, ok: bool):
+        self.samples.append((latency_s, ok))
+        self.probe_started = 0.0
+        if ok:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown_s
+
+    @property
+    def state(self) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half_open"
+
+    def available(self) -> bool:
+        state = self.state
+        # one probe per cooldown period; a probe that never reports back does not wedge the circuit
+        return state == "closed" or (
+            state == "half_open" and time.monotonic() - self.probe_started > self.cooldown_s
+        )
+
+    def allow(self) -> bool:
+        """Like ``available``, but claims the half-open probe slot."""
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self.probe_started = time.monotonic()
+        return True
+
+    def latency(self, q: float) -> Optional[float]:
+        ok = [lat for lat, good in self.samples if good]
+        return _percentile(ok, q) if ok else None
+
+    def stats(self) -> Dict[str, Any]:
+        n = len(self.samples)
+        p50, p95 = self.latency(0.5), self.latency(0.95)
+        return {
+            "state": self.state,
+            "samples": n,
+            "error_rate": round(sum(1 for _, ok in self.samples if not ok) / n, 4) if n else 0.0,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class LLMRouter:
+    """Route a prompt across LLM backends by policy.
+
+    ``priority`` tries backends in the configured order; ``fastest`` orders
+    them by rolling median latency (backends without samples first, so they
+    get measured). Backends with an open circuit or that are not ready are
+    skipped, and an error falls through to the next candidate. With hedging
+    on, a second backend is started once the first exceeds its p95 latency
+    and whichever succeeds first wins.
+    """
+
+    def __init__(self, order: List[str], policy: str = "priority", hedge: bool = False):
+        self.order = list(order)
+        self.policy = policy if policy in POLICIES else "priority"
+        self.hedge = hedge
+        self.hedge_min_s = float(os.environ.get("K_SASA_LLM_HEDGE_MIN_MS", "500")) / 1000.0
+        # deadline used until a backend has enough samples for a p95
+        self.hedge_default_s = float(os.environ.get("K_SASA_LLM_HEDGE_MS", "4000")) / 1000.0
+        self.hedge_min_samples = 20
+        self.ask_fns: Dict[str, AskFn] = {}
+        self.stream_fns: Dict[str, StreamFn] = {}
+        self.ready_fns: Dict[str, Callable[[], bool]] = {}
+        self.health: Dict[str, BackendHealth] = {}
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def register(self, name: str, ask: AskFn, stream: StreamFn, ready: Optional[Callable[[], bool]] = None):
+        self.ask_fns[name] = ask
+        self.stream_fns[name] = stream
+        if ready is not None:
+            self.ready_fns[name] = ready
+        self.health[name] = BackendHealth(
+            window=int(os.environ.get("K_SASA_LLM_WINDOW", "100")),
+            failures=int(os.environ.get("K_SASA_LLM_CB_FAILURES", "5")),
+            cooldown_s=float(os.environ.get("K_SASA_LLM_CB_COOLDOWN_S", "30")),
+        )
+        if name not in self.order:
+            self.order.append(name)
+
+    def candidates(self, policy: Optional[str] = None) -> List[str]:
+        names = [n for n in self.order if n in self.ask_fns and self.ready_fns.get(n, lambda: True)()]
+        if (policy or self.policy) == "fastest":
+            names.sort(key=lambda n: self.health[n].latency(0.5) or 0.0)
+        return [n for n in names if self.health[n].available()]
+
+    def _hedge_after(self, name: str) -> float:
+        health = self.health[name]
+        p95 = health.latency(0.95)
+        if p95 is None or len(health.samples) < self.hedge_min_samples:
+            return self.hedge_default_s
+        return max(self.hedge_min_s, p95)
+
+    async def call(self, name: str, prompt: str) -> Dict[str, Any]:
+        if not self.health[name].allow():
+            return {"error": f"{name} circuit open"}
+        t0 = time.monotonic()
+        try:
+            data = await self.ask_fns[name](prompt)
+        except Exception as exc:
+            data = {"error": str(exc)}
+        self.health[name].record(time.monotonic() - t0, "error" not in data)
+        return data
+
+    async def ask(
+        self, prompt: str, policy: Optional[str] = None, hedge: Optional[bool] = None
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Return ``(reply, backend)``; reply carries ``error`` if every candidate failed."""
+        names = self.candidates(policy)
+        if not names:
+            return {"error": "no LLM backend available"}, None
+        hedge = self.hedge if hedge is None else hedge
+        last: Tuple[Dict[str, Any], Optional[str]] = ({"error": "no LLM backend available"}, None)
+        while names:
+            name = names.pop(0)
+            if not hedge or not names:
+                data = await self.call(name, prompt)
+                if "error" not in data:
+                    return data, name
+                last = (data, name)
+                continue
+            data, used = await self._hedged(name, names, prompt)
+            if "error" not in data:
+                return data, used
+            last = (data, used)
+        return last
+
+    async def _hedged(self, primary: str, rest: List[str], prompt: str) -> Tuple[Dict[str, Any], str]:
+        tasks = {asyncio.ensure_future(self.call(primary, prompt)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self._hedge_after(primary))
+        if not done:
+            # primary is past its p95: race it against the next backend
+            backup = rest.pop(0)
+            self.hedged += 1
+            tasks[asyncio.ensure_future(self.call(backup, prompt))] = backup
+        result: Tuple[Dict[str, Any], str] = ({"error": "no LLM backend available"}, primary)
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    data = task.result()
+                    result = (data, tasks[task])
+                    if "error" not in data:
+                        if tasks[task] != primary:
+                            self.hedge_wins += 1
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, prompt: str, policy: Optional[str] = None) -> AsyncIterator[Tuple[str, str]]:
+        """Yield ``(backend, text)`` pieces; a backend failing before its first piece falls through."""
+        names = self.candidates(policy)
+        if not names:
+            raise RuntimeError("no LLM backend available")
+        error: Optional[Exception] = None
+        for name in names:
+            if not self.health[name].allow():
+                continue
+            t0 = time.monotonic()
+            started = False
+            try:
+                async for piece in self.stream_fns[name](prompt):
+                    started = True
+                    yield name, piece
+            except Exception as exc:
+                self.health[name].record(time.monotonic() - t0, False)
+                if started:
+                    raise
+                error = exc
+                continue
+            self.health[name].record(time.monotonic() - t0, True)
+            return
+        raise RuntimeError(str(error) if error else "no LLM backend available")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "order": self.order,
+            "hedge": self.hedge,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "backends": {name: h.stats() for name, h in self.health.items()},
+        }
@@ -1,20 +1,41 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, AsyncIterator, Iterator, List, Optional, Tuple, Union
 from uuid import uuid4
 from app.agents.orchestrator import AgentOrchestrator
 from app.agents.education_adapter import EducationAdapter
 from app.agents.health_adapter import HealthAdapter
 from app.agents.governance_adapter import GovernanceAdapter
-from app.rag import SimpleRetriever, format_citations
+from app.rag import PartitionedRetriever, format_citations
+from app.batching import MicroBatcher
 from app.audit import write_audit
 from app.hitl import enqueue, list_pending, approve, decline
 import os
 from app.model import ModelWrapper
-from app.voice import transcribe, synthesize
-from app.openai_client import ask_ksasa
+from app import kiswahili_local_model
+from app.warmup import Warmup
+from app.translator_pool import TranslatorPool
+from app.voice import (
+    AudioTooLarge,
+    MultipartAudio,
+    max_audio_bytes,
+    synthesize,
+    transcribe,
+    tts_cache_stats,
+    warm_stt,
+    warm_tts,
+    whisper_models,
+)
+from app import llm_pool, ollama_client
+from app.openai_client import SYSTEM_PROMPT, ask_ksasa_async, openai_model, parse_reply, stream_ksasa_async
+from app.response_cache import ResponseCache, cache_key
+from app.llm_router import LLMRouter
+from functools import partial
+import json
 import time
 from app.telemetry import log_event, prompt_hash, record_request, snapshot_metrics
 
@@ -39,6 +60,7 @@ class Citation(BaseModel):
     source: str
     snippet: str
     score: float
+    refs: List[str] = []
 
 
 class ChatResponse(BaseModel):
@@ -60,6 +82,7 @@ class STTRequest(BaseModel):
     audio_base64: Optional[str] = None
     audio_url: Optional[str] = None
     language: Optional[str] = "sw"
+    model: Optional[str] = None  # Whisper model, one of K_SASA_WHISPER_MODELS
 
 
 class STTResponse(BaseModel):
@@ -85,6 +108,9 @@ class AgentAskRequest(BaseModel):
     domain: str
     prompt: str
     context: Optional[dict] = None
+    backend: Optional[str] = None  # auto | openai | ollama | local; default K_SASA_LLM_BACKEND
+    policy: Optional[str] = None  # auto only: priority | fastest; default K_SASA_LLM_POLICY
+    hedge: Optional[bool] = None  # auto only: hedge slow requests; default K_SASA_LLM_HEDGE
 
 
 class AgentActionRequest(BaseModel):
@@ -98,41 +124,164 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    # 503 until warm-up has finished; components report "ready", "fallback" or "failed"
+    state = warmup.snapshot()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _event_stream(events: Union[Iterator[str], AsyncIterator[str]]) -> StreamingResponse:
+    # no-cache / no proxy buffering so each token reaches the client as soon as it is produced
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _chat_response(result: dict, audit_id: str) -> ChatResponse:
+    return ChatResponse(
+        reply=result.get("reply", ""),
+        confidence=float(result.get("confidence", 0.0)),
+        citations=[Citation(**c) for c in result.get("citations", [])],
+        audit_id=audit_id,
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
 def chat(req: ChatRequest):
     audit_id = f"audit-{uuid4()}"
     domain = (req.domain or "").lower() if req.domain else ""
     context = {"channel": req.channel, "user_id": req.user_id, "audit_id": audit_id}
     result = orchestrator.handle(domain=domain, message=req.message, context=context)
-    cits = [Citation(**c) for c in result.get("citations", [])]
-    return ChatResponse(
-        reply=result.get("reply", ""),
-        confidence=float(result.get("confidence", 0.0)),
-        citations=cits,
-        audit_id=audit_id,
-    )
+    return _chat_response(result, audit_id)
+
+
+@app.post("/chat/stream")
+def chat_stream(req: ChatRequest):
+    """Server-Sent Events: ``token`` events with reply text, then ``done`` with the ChatResponse."""
+    audit_id = f"audit-{uuid4()}"
+    domain = (req.domain or "").lower() if req.domain else ""
+    context = {"channel": req.channel, "user_id": req.user_id, "audit_id": audit_id}
+
+    def events():
+        try:
+            for ev in orchestrator.stream(domain=domain, message=req.message, context=context):
+                if ev["event"] == "done":
+                    yield _sse("done", _chat_response(ev["data"], audit_id).model_dump())
+                else:
+                    yield _sse("token", {"text": ev["data"]})
+        except Exception as exc:
+            yield _sse("error", {"error": str(exc), "audit_id": audit_id})
+
+    return _event_stream(events())
+
+
+LLM_BACKENDS = {"openai": "OpenAI", "ollama": "Ollama", "local": "Local model"}
+
+
+def _llm_backend(requested: Optional[str]) -> str:
+    # "auto" lets the router pick a backend by policy, latency and circuit state
+    backend = (requested or os.environ.get("K_SASA_LLM_BACKEND", "auto")).lower()
+    return backend if backend in LLM_BACKENDS or backend == "auto" else "auto"
+
+
+def _local_prompt(prompt: str) -> Tuple[str, str]:
+    # the system prompt is a fixed prefix, so the local model reuses its cached KV state
+    return model.chat_suffix(prompt), model.chat_prefix(SYSTEM_PROMPT)
+
+
+def _backend_model(backend: str) -> str:
+    if backend == "auto":
+        return ",".join(f"{name}={_backend_model(name)}" for name in llm_router.order)
+    if backend == "ollama":
+        return ollama_client.ollama_model()
+    if backend == "local":
+        return model.model_id
+    return openai_model()
+
+
+async def _ask_backend(
+    backend: str, prompt: str, policy: Optional[str] = None, hedge: Optional[bool] = None
+) -> Tuple[dict, Optional[str]]:
+    """Return ``(reply, backend used)``; explicit backends still feed the router's latency/health stats."""
+    # Repeated questions (e.g. the same SMS from many users) are answered from the cache
+    key = cache_key(prompt, backend, _backend_model(backend))
+    cached = ask_cache.get(key)
+    if cached is not None:
+        return cached, backend
+    if backend == "auto":
+        data, used = await llm_router.ask(prompt, policy=policy, hedge=hedge)
+    elif backend in llm_router.health:
+        data, used = await llm_router.call(backend, prompt), backend
+    else:
+        data, used = await _call_backend(backend, prompt), backend
+    if "error" not in data:
+        ask_cache.put(key, data)
+    return data, used
+
+
+async def _call_backend(backend: str, prompt: str) -> dict:
+    # Remote backends are awaited on the event loop; only the local model occupies a worker thread
+    if backend == "ollama":
+        data = await ollama_client.ask_ksasa_async(prompt)
+        # plain-text Ollama replies come back as {"text": ...}
+        return parse_reply(data["text"]) if "text" in data and "response" not in data else data
+    if backend == "local":
+        if model.pipeline is None:
+            return {"error": "local model is not loaded"}
+        return parse_reply(await run_in_threadpool(model.generate_text, *_local_prompt(prompt)))
+    return await ask_ksasa_async(prompt)
+
+
+async def _stream_backend(backend: str, prompt: str) -> AsyncIterator[str]:
+    if backend == "ollama":
+        pieces = ollama_client.stream_ksasa_async(prompt)
+    elif backend == "local":
+        if model.pipeline is None:
+            raise RuntimeError("local model is not loaded")
+        pieces = iterate_in_threadpool(model.stream_text(*_local_prompt(prompt)))
+    else:
+        pieces = stream_ksasa_async(prompt)
+    async for piece in pieces:
+        yield piece
+
+
+async def _stream_routed(backend: str, prompt: str, policy: Optional[str] = None) -> AsyncIterator[Tuple[str, str]]:
+    if backend == "auto":
+        async for item in llm_router.stream(prompt, policy=policy):
+            yield item
+        return
+    async for piece in _stream_backend(backend, prompt):
+        yield backend, piece
+
+
+def _agent_reply(data: dict, backend: Optional[str] = "openai") -> str:
+    if "error" in data:
+        return f"{LLM_BACKENDS.get(backend or '', 'LLM')} error: {data['error']}"
+    resp = data.get("response", "")
+    instructions = data.get("instructions") or []
+    if isinstance(instructions, list) and instructions:
+        steps = "\n".join(f"- {step}" for step in instructions)
+        return f"{resp}\n\nSteps:\n{steps}"
+    return str(resp)
 
 
 @app.post("/agent/ask", response_model=ChatResponse)
-def agent_ask(req: AgentAskRequest):
+async def agent_ask(req: AgentAskRequest):
     audit_id = f"audit-{uuid4()}"
-    data = ask_ksasa(req.prompt)
+    backend = _llm_backend(req.backend)
+    data, used = await _ask_backend(backend, req.prompt, req.policy, req.hedge)
 
     # Defaults
-    reply_text = ""
     conf = 1.0
     citations: list[dict] = []
-
-    if "error" in data:
-        reply_text = f"OpenAI error: {data['error']}"
-    else:
-        resp = data.get("response", "")
-        instructions = data.get("instructions") or []
-        if isinstance(instructions, list) and instructions:
-            steps = "\n".join(f"- {step}" for step in instructions)
-            reply_text = f"{resp}\n\nSteps:\n{steps}"
-        else:
-            reply_text = str(resp)
+    reply_text = _agent_reply(data, used)
 
     return ChatResponse(
         reply=reply_text,
@@ -142,6 +291,42 @@ def agent_ask(req: AgentAskRequest):
     )
 
 
+@app.post("/agent/ask/stream")
+async def agent_ask_stream(req: AgentAskRequest):
+    """Server-Sent Events: raw completion deltas as ``token`` events, then ``done`` with the parsed ChatResponse."""
+    audit_id = f"audit-{uuid4()}"
+    backend = _llm_backend(req.backend)
+    key = cache_key(req.prompt, backend, _backend_model(backend))
+
+    async def events():
+        cached = ask_cache.get(key)
+        yield _sse("start", {"audit_id": audit_id, "backend": backend, "cached": cached is not None})
+        if cached is not None:
+            # a cache hit has no raw deltas; send the formatted reply as one token
+            reply = _agent_reply(cached, backend)
+            yield _sse("token", {"text": reply})
+        else:
+            parts = []
+            used = backend
+            try:
+                async for used, piece in _stream_routed(backend, req.prompt, req.policy):
+                    if not parts:
+                        yield _sse("backend", {"backend": used})
+                    parts.append(piece)
+                    yield _sse("token", {"text": piece})
+            except Exception as exc:
+                label = LLM_BACKENDS.get(used, "LLM")
+                yield _sse("error", {"error": f"{label} error: {exc}", "audit_id": audit_id})
+                return
+            data = parse_reply("".join(parts))
+            ask_cache.put(key, data)
+            reply = _agent_reply(data, used)
+        done = ChatResponse(reply=reply, confidence=1.0, citations=[], audit_id=audit_id)
+        yield _sse("done", done.model_dump())
+
+    return _event_stream(events())
+
+
 @app.post("/agent/action")
 def agent_action(req: AgentActionRequest):
     payload = req.payload or {}
@@ -214,10 +399,81 @@ def admin_decline(req: ReviewRequest):
     return decline(req.pending_id, req.reason or "")
 
 
+class RagDocumentRequest(BaseModel):
+    doc_id: str
+    text: str
+    domain: str  # education | health | governance | general
+
+
+@app.get("/admin/rag/documents")
+def admin_rag_documents():
+    return {"items": retriever.list_documents(), "stats": retriever.stats()}
+
+
+@app.post("/admin/rag/documents")
+def admin_rag_upsert(req: RagDocumentRequest):
+    result = retriever.add_document(req.doc_id, req.text, req.domain)
+    if "error" in result:
+        return result
+    write_audit({"event": "rag.upsert", **result})
+    return result
+
+
+@app.delete("/admin/rag/documents/{doc_id:path}")
+def admin_rag_delete(doc_id: str, domain: Optional[str] = None):
+    if not retriever.delete_document(doc_id, domain):
+        return {"error": "not_found"}
+    write_audit({"event": "rag.delete", "doc_id": doc_id})
+    return {"status": "deleted", "doc_id": doc_id}
+
+
+@app.post("/admin/rag/compact")
+def admin_rag_compact():
+    retriever.compact()
+    retriever.save()
+    return retriever.stats()
+
+
+class RagSearchRequest(BaseModel):
+    query: str
+    k: int = 4
+    domain: Optional[str] = None
+
+
+RAG_SEARCH_MAX_BATCH = int(os.environ.get("K_SASA_RAG_SEARCH_MAX_BATCH", "64"))
+
+
+class RagSearchBatchRequest(BaseModel):
+    # larger batches are rejected with 422 before encoding or taking the retriever lock
+    queries: List[str] = Field(max_length=RAG_SEARCH_MAX_BATCH)
+    k: int = 4
+    domain: Optional[str] = None
+
+
+@app.post("/rag/search")
+def rag_search(req: RagSearchRequest):
+    # Concurrent callers are coalesced into one retrieve_many call
+    retrieved = retrieval_batcher.submit((req.query, req.k, req.domain))
+    return {"citations": format_citations(retrieved)}
+
+
+@app.post("/rag/search_batch")
+def rag_search_batch(req: RagSearchBatchRequest):
+    results = retriever.retrieve_many(req.queries, req.k, domain=req.domain)
+    return {"results": [{"query": q, "citations": format_citations(r)} for q, r in zip(req.queries, results)]}
+
+
+def _too_large(exc: Exception) -> JSONResponse:
+    return JSONResponse({"error": str(exc)}, status_code=413)
+
+
 @app.post("/voice/stt", response_model=STTResponse)
 def voice_stt(req: STTRequest):
     audit_id = f"audit-{uuid4()}"
-    transcript, conf = transcribe(req.audio_base64, req.audio_url, req.language or "sw")
+    try:
+        transcript, conf = transcribe(req.audio_base64, req.audio_url, req.language or "sw", req.model)
+    except AudioTooLarge as exc:
+        return _too_large(exc)
     write_audit({
         "audit_id": audit_id,
         "event": "voice.stt",
@@ -226,6 +482,62 @@ def voice_stt(req: STTRequest):
     return STTResponse(transcript=transcript, confidence=float(conf), audit_id=audit_id)
 
 
+# multipart boundaries and part headers on top of the audio itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+async def _read_capped(request: Request, cap: int) -> bytes:
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > cap:
+        raise AudioTooLarge(f"audio larger than {max_audio_bytes()} bytes")
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > cap:
+            raise AudioTooLarge(f"audio larger than {max_audio_bytes()} bytes")
+    return bytes(data)
+
+
+async def _read_audio(request: Request) -> bytes:
+    limit = max_audio_bytes()
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return await _read_capped(request, limit)
+    # The file part is parsed out of the stream into memory; the whole body stays under the cap too
+    cap = limit + MULTIPART_OVERHEAD
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > cap:
+        raise AudioTooLarge(f"audio larger than {limit} bytes")
+    upload = MultipartAudio(content_type, limit)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > cap:
+            raise AudioTooLarge(f"audio larger than {limit} bytes")
+        upload.feed(chunk)
+    return upload.finish()
+
+
+@app.post("/voice/stt/upload", response_model=STTResponse)
+async def voice_stt_upload(request: Request, language: str = "sw", model: Optional[str] = None):
+    """Speech-to-text from the raw audio request body, or a multipart ``file`` part; no base64 or temp files."""
+    audit_id = f"audit-{uuid4()}"
+    try:
+        data = await _read_audio(request)
+        transcript, conf = await run_in_threadpool(transcribe, None, None, language, model, data)
+    except AudioTooLarge as exc:
+        return _too_large(exc)
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    write_audit({
+        "audit_id": audit_id,
+        "event": "voice.stt",
+        "language": language,
+        "bytes": len(data),
+    })
+    return STTResponse(transcript=transcript, confidence=float(conf), audit_id=audit_id)
+
+
 @app.post("/voice/tts", response_model=TTSResponse)
 def voice_tts(req: TTSRequest):
     audit_id = f"audit-{uuid4()}"
@@ -250,8 +562,11 @@ class STTToAgentRequest(BaseModel):
 
 
 @app.post("/voice/stt_to_agent", response_model=ChatResponse)
-def voice_stt_to_agent(req: STTToAgentRequest):
-    transcript, _ = transcribe(req.audio_base64, req.audio_url, req.language or "sw")
+async def voice_stt_to_agent(req: STTToAgentRequest):
+    try:
+        transcript, _ = await run_in_threadpool(transcribe, req.audio_base64, req.audio_url, req.language or "sw")
+    except AudioTooLarge as exc:
+        return _too_large(exc)
     # Reuse agent_ask flow
     ask = AgentAskRequest(
         user_id=req.user_id,
@@ -260,7 +575,7 @@ def voice_stt_to_agent(req: STTToAgentRequest):
         prompt=transcript,
         context=req.context or {"language": req.language},
     )
-    return agent_ask(ask)
+    return await agent_ask(ask)
 
 
 class SMSInboundRequest(BaseModel):
@@ -273,7 +588,7 @@ class SMSInboundRequest(BaseModel):
 
 
 @app.post("/sms/inbound")
-def sms_inbound(req: SMSInboundRequest):
+async def sms_inbound(req: SMSInboundRequest):
     user_id = req.user_id or req.from_number
     domain = (req.domain or "education")
     ask = AgentAskRequest(
@@ -283,33 +598,173 @@ def sms_inbound(req: SMSInboundRequest):
         prompt=req.text,
         context={"session_id": req.session_id},
     )
-    resp = agent_ask(ask)
+    resp = await agent_ask(ask)
     return resp
 
 
+TRANSLATE_MAX_CHARS = int(os.environ.get("K_SASA_TRANSLATE_MAX_CHARS", "2000"))
+TranslateText = Annotated[str, Field(max_length=TRANSLATE_MAX_CHARS)]
+
+
+class TranslateOptions(BaseModel):
+    # out-of-range values are rejected with 422 before reaching the translator
+    beam_size: Optional[int] = Field(None, ge=1, le=kiswahili_local_model.MAX_BEAM)
+    max_len: Optional[int] = Field(None, ge=1, le=kiswahili_local_model.MAX_DECODE_LEN)
+    length_penalty: Optional[float] = Field(None, ge=0.0, le=2.0)
+
+
+class GenerateRequest(TranslateOptions):
+    text: TranslateText
+
+
+class TranslateBatchRequest(TranslateOptions):
+    texts: List[TranslateText]
+
+
+TRANSLATE_MAX_BATCH = int(os.environ.get("K_SASA_TRANSLATE_MAX_BATCH", "512"))
+
+
+async def _translate(texts: List[str], opts: TranslateOptions):
+    try:
+        return await translator_pool.translate(texts, **opts.model_dump(include=set(TranslateOptions.model_fields)))
+    except (ImportError, RuntimeError) as exc:
+        # torch or the checkpoint is missing, or a worker process died
+        return JSONResponse({"error": f"translator unavailable: {exc}"}, status_code=503)
+
+
 @app.post("/generate")
-async def generate(payload: dict):
-    text = payload["text"]
-    output = kiswahili_translate(text)
-    return {"output": output}
+async def generate(req: GenerateRequest):
+    outputs = await _translate([req.text], req)
+    if isinstance(outputs, JSONResponse):
+        return outputs
+    return {"output": outputs[0]}
 
 
-@app.get("/metrics")
-def metrics():
-    return snapshot_metrics()
+@app.post("/translate/batch")
+async def translate_batch(req: TranslateBatchRequest):
+    if len(req.texts) > TRANSLATE_MAX_BATCH:
+        return JSONResponse({"error": f"at most {TRANSLATE_MAX_BATCH} texts per request"}, status_code=413)
+    outputs = await _translate(req.texts, req)
+    if isinstance(outputs, JSONResponse):
+        return outputs
+    return {"outputs": outputs}
 
 
-orchestrator = AgentOrchestrator()
-retriever = SimpleRetriever()
+@app.get("/metrics")
+def metrics():
+    return {
+        **snapshot_metrics(),
+        "retrieval_batching": retrieval_batcher.stats(),
+        "generation_batching": model.batching_stats(),
+        "ask_cache": ask_cache.stats(),
+        "llm_pools": llm_pool.pool_stats(),
+        "llm_router": llm_router.stats(),
+        "translator": {**kiswahili_local_model.info(), "pool": translator_pool.stats()},
+        "stt_models": whisper_models.stats(),
+        "tts_cache": dict(tts_cache_stats),
+    }
+
+
+DOMAINS = ["education", "health", "governance"]
+# Encoders and models load in the warm-up below; until then requests take the fallback paths
+retriever = PartitionedRetriever(DOMAINS, load_model=False)
 # shared lightweight model wrapper (placeholder)
-model = ModelWrapper()
-# Attempt to build from project seed data
+model = ModelWrapper(load=False)
 seed_dir = os.environ.get(
     "K_SASA_SEED_DIR",
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "seed")),
 )
-retriever.build_from_seed(seed_dir)
 
-orchestrator.register("education", EducationAdapter(retriever, model))
-orchestrator.register("health", HealthAdapter(retriever))
-orchestrator.register("governance", GovernanceAdapter(retriever))
+
+def _warm_retriever() -> bool:
+    # Attempt to build from project seed data
+    loaded = retriever.load_model()
+    retriever.build_from_seed(seed_dir)
+    return loaded
+
+
+ask_cache = ResponseCache(
+    max_entries=int(os.environ.get("K_SASA_ASK_CACHE_SIZE", "10000")),
+    ttl_s=float(os.environ.get("K_SASA_ASK_CACHE_TTL", "3600")),
+    path=os.environ.get("K_SASA_ASK_CACHE_PATH") or None,
+    compact_ratio=float(os.environ.get("K_SASA_ASK_CACHE_COMPACT_RATIO", "0.5")),
+)
+
+llm_router = LLMRouter(
+    order=[b.strip() for b in os.environ.get("K_SASA_LLM_ORDER", "openai,ollama,local").split(",") if b.strip()],
+    policy=os.environ.get("K_SASA_LLM_POLICY", "priority"),
+    hedge=os.environ.get("K_SASA_LLM_HEDGE", "0") == "1",
+)
+_llm_ready = {
+    "openai": lambda: bool(os.environ.get("OPENAI_API_KEY")),
+    "local": lambda: model.pipeline is not None,
+}
+for _name in list(llm_router.order):
+    if _name in LLM_BACKENDS:
+        llm_router.register(
+            _name, partial(_call_backend, _name), partial(_stream_backend, _name), _llm_ready.get(_name)
+        )
+
+warmup = Warmup()
+warmup.add("retriever", _warm_retriever)
+translator_pool = TranslatorPool.from_env()
+warmup.add("translator", translator_pool.warm)
+warmup.add("llm", model.load)
+if os.environ.get("K_SASA_STT", "stub").lower() == "whisper":
+    warmup.add("stt", warm_stt)
+if os.environ.get("K_SASA_TTS", "stub").lower() == "coqui":
+    warmup.add("tts", warm_tts)
+
+
+@app.on_event("startup")
+def start_warmup():
+    # background (default): serve immediately and warm up behind the scenes; eager: block startup;
+    # off (tests only): report ready at once; the RAG index and local LLM are never built, while the
+    # translator and voice engines still load on first use
+    mode = os.environ.get("K_SASA_WARMUP", "background").lower()
+    if mode == "eager":
+        warmup.run()
+    elif mode == "off":
+        warmup.skip()
+    else:
+        warmup.start()
+
+
+def _retrieve_batch(items):
+    # Items are (query, k, domain); one retrieve_many per domain present in the batch
+    results: List = [None] * len(items)
+    by_domain: dict = {}
+    for i, (_, _, domain) in enumerate(items):
+        by_domain.setdefault(domain, []).append(i)
+    for domain, idxs in by_domain.items():
+        k = max(items[i][1] for i in idxs)
+        found = retriever.retrieve_many([items[i][0] for i in idxs], k, domain=domain)
+        for i, r in zip(idxs, found):
+            results[i] = r[: items[i][1]]
+    return results
+
+
+retrieval_batcher = MicroBatcher(
+    _retrieve_batch,
+    max_batch=int(os.environ.get("K_SASA_RAG_BATCH_MAX", "32")),
+    max_wait_ms=float(os.environ.get("K_SASA_RAG_BATCH_WAIT_MS", "5")),
+    name="rag-batcher",
+)
+
+
+def _search_evidence(query: str, domain: str, k: int):
+    return format_citations(retrieval_batcher.submit((query, k, domain)))
+
+
+orchestrator = AgentOrchestrator(search=_search_evidence)
+orchestrator.register("education", EducationAdapter(retriever.for_domain("education"), model))
+orchestrator.register("health", HealthAdapter(retriever.for_domain("health")))
+orchestrator.register("governance", GovernanceAdapter(retriever.for_domain("governance")))
+
+
+@app.on_event("shutdown")
+async def close_pools():
+    await llm_pool.aclose_all()
+    translator_pool.shutdown()
+    await run_in_threadpool(retriever.flush)
+    await run_in_threadpool(ask_cache.flush)
@@ -1,16 +1,53 @@
 import os
-from typing import Dict, List
+import queue
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.batching import MicroBatcher
+from app.gen_budget import LESSON_SECTIONS, GenerationBudget, budget_criteria
+from app.prefix_cache import PrefixKVCache, copy_past, expand_past
+from app.telemetry import log_event
+
+LESSON_SYSTEM_SW = (
+    "Wewe ni msaidizi wa elimu unayetengeneza mpango wa somo wa dakika 30 kwa shule ya msingi kwa Kiswahili."
+    " Zingatia malengo ya kujifunza, vifaa, shughuli zenye mgawanyo wa muda, na tathmini."
+    " Hakikisha mpango ni salama na unafaa umri."
+)
+LESSON_SCAFFOLD_SW = "Jibu kwa muundo: Malengo ya Kujifunza, Vifaa, Shughuli (kwa mgawanyo wa muda), Tathmini."
 
 
 class ModelWrapper:
-    def __init__(self):
+    def __init__(self, load: bool = True):
         self.pipeline = None
+        self.model_id = os.environ.get("K_SASA_MODEL_ID", "meta-llama/Meta-Llama-3.1-8B-Instruct")
+        self.gen_kwargs = {"max_new_tokens": 600, "do_sample": True, "temperature": 0.6, "top_p": 0.9}
+        self._batcher: Optional[MicroBatcher] = None
+        # KV state of fixed prompt prefixes (system prompt + answer scaffold), reused across requests
+        self.prefix_cache: Optional[PrefixKVCache] = (
+            PrefixKVCache.from_env() if os.environ.get("K_SASA_PREFIX_CACHE", "1") == "1" else None
+        )
+        self.prefix_cache_errors = 0
+        self.prefix_cache_disabled: Optional[str] = None
+        # load=False leaves the fallback plan in place until load() is called (e.g. by the warm-up thread)
+        if load:
+            self.load()
+
+    def load(self) -> bool:
+        """Load the model; returns False (fallback plans only) if it cannot be loaded."""
         self._init_model()
+        if self.pipeline is not None:
+            # Concurrent requests are coalesced into one padded generate() call
+            self._batcher = MicroBatcher(
+                self.generate_batch,
+                max_batch=int(os.environ.get("K_SASA_GEN_BATCH_MAX", "8")),
+                max_wait_ms=float(os.environ.get("K_SASA_GEN_BATCH_WAIT_MS", "20")),
+                name="lesson-plan-batcher",
+            )
+        return self.pipeline is not None
 
     def _init_model(self):
-        model_id = os.environ.get(
-            "K_SASA_MODEL_ID", "meta-llama/Meta-Llama-3.1-8B-Instruct"
-        )
+        model_id = self.model_id
         load_4bit = os.environ.get("K_SASA_LOAD_4BIT", "1") == "1"
         try:
             import transformers  # type: ignore
@@ -33,6 +70,10 @@ class ModelWrapper:
                     pass
 
             tok = AutoTokenizer.from_pretrained(model_id, trust_remote_code=True)
+            # Decoder-only models must be left-padded for batched generation
+            tok.padding_side = "left"
+            if tok.pad_token is None:
+                tok.pad_token = tok.eos_token
             mdl = AutoModelForCausalLM.from_pretrained(
                 model_id, trust_remote_code=True, **kwargs
             )
@@ -40,10 +81,7 @@ class ModelWrapper:
                 "text-generation",
                 model=mdl,
                 tokenizer=tok,
-                max_new_tokens=600,
-                do_sample=True,
-                temperature=0.6,
-                top_p=0.9,
+                **self.gen_kwargs,
             )
         except Exception:
             self.pipeline = None
@@ -67,32 +105,250 @@ class ModelWrapper:
             "- Maswali mafupi ya kukagua ufahamu\n"
         )
 
-    def generate_lesson_plan(self, context: Dict, evidence: List[Dict]) -> str:
-        language = (context.get("language", "sw") or "sw").lower()
+    @staticmethod
+    def chat_prefix(system: str) -> str:
+        return f"<s>[SYSTEM]\n{system}\n[/SYSTEM]\n[USER]\n"
+
+    @staticmethod
+    def chat_suffix(user: str) -> str:
+        return f"{user}\n[/USER]\n[ASSISTANT]"
+
+    @classmethod
+    def chat_prompt(cls, system: str, user: str) -> str:
+        return cls.chat_prefix(system) + cls.chat_suffix(user)
+
+    def _lesson_prompt(self, context: Dict, evidence: List[Dict]) -> Tuple[str, str]:
+        """Return ``(prefix, rest)``; the prefix is identical for every request so its KV state is cached."""
         subject = context.get("subject", "Somo")
         grade = context.get("grade", "").__str__()
         duration = context.get("duration_minutes", 30)
-
-        if self.pipeline is None:
-            return self._fallback_plan(context)
-
         evidence_text = "\n".join(
             [f"- Chanzo: {c.get('source')} | Dondoo: {c.get('snippet')}" for c in evidence][:6]
         )
-        system_sw = (
-            "Wewe ni msaidizi wa elimu unayetengeneza mpango wa somo wa dakika 30 kwa shule ya msingi kwa Kiswahili."
-            " Zingatia malengo ya kujifunza, vifaa, shughuli zenye mgawanyo wa muda, na tathmini."
-            " Hakikisha mpango ni salama na unafaa umri."
-        )
+        # The fixed answer scaffold comes before the per-request details so it is part of the prefix
+        prefix = self.chat_prefix(LESSON_SYSTEM_SW) + LESSON_SCAFFOLD_SW + "\n"
         user_sw = (
             f"Tengeneza mpango wa somo wa dakika {duration} kwa '{subject}', Darasa la {grade}.\n"
-            f"Ushahidi (RAG):\n{evidence_text}\n"
-            "Jibu kwa muundo: Malengo ya Kujifunza, Vifaa, Shughuli (kwa mgawanyo wa muda), Tathmini."
+            f"Ushahidi (RAG):\n{evidence_text}"
         )
-        prompt = f"<s>[SYSTEM]\n{system_sw}\n[/SYSTEM]\n[USER]\n{user_sw}\n[/USER]\n[ASSISTANT]"
-        out = self.pipeline(prompt)
-        text = out[0]["generated_text"]
-        # naive post-process: get assistant continuation
-        if "[ASSISTANT]" in text:
-            text = text.split("[ASSISTANT]")[-1].strip()
+        return prefix, self.chat_suffix(user_sw)
+
+    def _encode_prefix(self, prefix: str):
+        import torch  # type: ignore
+
+        tok = self.pipeline.tokenizer
+        mdl = self.pipeline.model
+        ids = tok(prefix, return_tensors="pt").input_ids.to(mdl.device)
+        with torch.no_grad():
+            past = mdl(input_ids=ids, use_cache=True).past_key_values
+        return ids, past
+
+    def _model_inputs(self, prefix: str, rest: str) -> Dict:
+        """Tokenized ``prefix + rest``, with the prefix's cached KV state when prefix caching is on."""
+        tok = self.pipeline.tokenizer
+        mdl = self.pipeline.model
+        if not prefix or self.prefix_cache is None:
+            return dict(tok(prefix + rest, return_tensors="pt").to(mdl.device))
+        return self._prefixed_inputs(prefix, [rest])
+
+    def _prefixed_inputs(self, prefix: str, rests: List[str]) -> Dict:
+        """Batch inputs sharing ``prefix``: its cached KV state is expanded to every row.
+
+        Rows are laid out as prefix, padding, rest, so the cached prefix
+        positions line up across the batch; the padding is masked out.
+        """
+        import torch  # type: ignore
+
+        tok = self.pipeline.tokenizer
+        ids, past = self.prefix_cache.get(prefix, self._encode_prefix)
+        rest_ids = [tok(r, add_special_tokens=False).input_ids for r in rests]
+        width = max(len(r) for r in rest_ids)
+        rows = [[tok.pad_token_id] * (width - len(r)) + r for r in rest_ids]
+        masks = [[0] * (width - len(r)) + [1] * len(r) for r in rest_ids]
+        n = len(rests)
+        input_ids = torch.cat([ids.expand(n, -1), torch.tensor(rows, device=ids.device)], dim=1)
+        attention_mask = torch.cat(
+            [torch.ones(n, ids.shape[1], dtype=torch.long), torch.tensor(masks, dtype=torch.long)], dim=1
+        ).to(ids.device)
+        # generate() only runs the forward pass over the tokens past the cached prefix
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "past_key_values": expand_past(copy_past(past), n),
+        }
+
+    def _generate_kwargs(self, tok, budgets: List[GenerationBudget]):
+        from transformers import StoppingCriteriaList  # type: ignore
+
+        criteria = budget_criteria(tok, budgets)
+        kwargs = {
+            **self.gen_kwargs,
+            "max_new_tokens": max(b.max_new_tokens for b in budgets),
+            "pad_token_id": tok.pad_token_id,
+            "stopping_criteria": StoppingCriteriaList([criteria]),
+        }
+        return kwargs, criteria
+
+    def _run_batch(self, inputs: Dict, budgets: List[GenerationBudget]) -> List[Tuple[str, Optional[str]]]:
+        tok = self.pipeline.tokenizer
+        kwargs, criteria = self._generate_kwargs(tok, budgets)
+        out = self.pipeline.model.generate(**inputs, **kwargs)
+        start = inputs["input_ids"].shape[1]
+        return [
+            (tok.decode(out[row, start:], skip_special_tokens=True).strip(), criteria.reasons[row])
+            for row in range(len(budgets))
+        ]
+
+    def _prefix_cache_failed(self, exc: Exception):
+        self.prefix_cache_errors += 1
+        self.prefix_cache.clear()
+        if isinstance(exc, (TypeError, ValueError)):
+            # generate() rejects a precomputed cache for this model: stop trying
+            self.prefix_cache = None
+            self.prefix_cache_disabled = f"{type(exc).__name__}: {exc}"
+            log_event({"event": "prefix_cache.disabled", "model": self.model_id, "error": self.prefix_cache_disabled})
+
+    def generate_batch(self, prompts: List[Tuple[str, str, GenerationBudget]]) -> List[Tuple[str, Optional[str]]]:
+        """Complete ``(prefix, rest, budget)`` prompts; returns ``(text, stop reason)`` per prompt.
+
+        When every prompt shares one prefix (lesson plans all do), the cached
+        prefix KV state is expanded across the batch; otherwise the prompts
+        run as one left-padded batch without it. Each row stops at its own
+        token budget, deadline or section end. Prompts whose deadline passed
+        while queued are not run.
+        """
+        results: List[Tuple[str, Optional[str]]] = [("", "deadline")] * len(prompts)
+        live = [i for i, (_, _, b) in enumerate(prompts) if b.deadline is None or b.remaining() > 0]
+        if not live:
+            return results
+        budgets = [prompts[i][2] for i in live]
+        prefixes = {prompts[i][0] for i in live}
+        done = None
+        if self.prefix_cache is not None and len(prefixes) == 1 and prefixes != {""}:
+            try:
+                done = self._run_batch(self._prefixed_inputs(prefixes.pop(), [prompts[i][1] for i in live]), budgets)
+            except Exception as exc:
+                # out-of-memory or a transient error: this batch runs uncached, the cache stays on
+                self._prefix_cache_failed(exc)
+        if done is None:
+            tok = self.pipeline.tokenizer
+            inputs = tok([prompts[i][0] + prompts[i][1] for i in live], return_tensors="pt", padding=True)
+            done = self._run_batch(inputs.to(self.pipeline.model.device), budgets)
+        for i, result in zip(live, done):
+            results[i] = result
+        return results
+
+    def generate_with_budget(
+        self, prompt: str, prefix: str = "", budget: Optional[GenerationBudget] = None
+    ) -> Tuple[str, Optional[str]]:
+        """Complete ``prefix + prompt`` within ``budget``, sharing batches with concurrent callers.
+
+        Returns ``(text, reason)``; reason is "deadline", "budget" or "sections"
+        when generation was cut short, None when the model finished on its own.
+        """
+        budget = budget or GenerationBudget.from_context({})
+        item = (prefix, prompt, budget)
+        if self._batcher is None:
+            return self.generate_batch([item])[0]
+        remaining = budget.remaining()
+        try:
+            # allow a little slack past the deadline for the batch to return the partial output
+            return self._batcher.submit(item, timeout=None if remaining is None else max(0.0, remaining) + 2.0)
+        except FutureTimeoutError:
+            return "", "deadline"
+
+    def generate_text(self, prompt: str, prefix: str = "", budget: Optional[GenerationBudget] = None) -> str:
+        return self.generate_with_budget(prompt, prefix, budget)[0]
+
+    def stream_text(self, prompt: str, prefix: str = "", budget: Optional[GenerationBudget] = None) -> Iterator[str]:
+        """Yield decoded text pieces of the completion of ``prefix + prompt`` as the model generates them.
+
+        Generation runs on a background thread feeding a TextIteratorStreamer;
+        closing the iterator early (client disconnect) stops generation, as
+        does the budget. An exception raised by generate() is re-raised here,
+        and a stall of more than K_SASA_GEN_STREAM_TIMEOUT_S between pieces
+        raises TimeoutError.
+        """
+        from transformers import StoppingCriteria, TextIteratorStreamer  # type: ignore
+
+        stop = threading.Event()
+
+        class _StopOnEvent(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop.is_set()
+
+        tok = self.pipeline.tokenizer
+        mdl = self.pipeline.model
+        timeout = float(os.environ.get("K_SASA_GEN_STREAM_TIMEOUT_S", "60"))
+        streamer = TextIteratorStreamer(tok, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        gen_kwargs, _ = self._generate_kwargs(tok, [budget or GenerationBudget.from_context({})])
+        gen_kwargs["stopping_criteria"].append(_StopOnEvent())
+        cached = bool(prefix) and self.prefix_cache is not None
+        kwargs = {**self._model_inputs(prefix, prompt), **gen_kwargs, "streamer": streamer}
+        failure: List[BaseException] = []
+
+        def _generate():
+            try:
+                mdl.generate(**kwargs)
+            except BaseException as exc:
+                failure.append(exc)
+            finally:
+                streamer.end()  # never leave the consumer waiting on the queue
+
+        threading.Thread(target=_generate, name="lesson-plan-stream", daemon=True).start()
+        try:
+            try:
+                for piece in streamer:
+                    if piece:
+                        yield piece
+            except queue.Empty:
+                raise TimeoutError(f"no output from the model for {timeout:g}s") from None
+            if failure:
+                if cached and self.prefix_cache is not None:
+                    self._prefix_cache_failed(failure[0])
+                raise failure[0]
+        finally:
+            stop.set()
+
+    def stream_lesson_plan(self, context: Dict, evidence: List[Dict]) -> Iterator[str]:
+        if self.pipeline is None:
+            yield self._fallback_plan(context)
+            return
+        prefix, rest = self._lesson_prompt(context, evidence)
+        budget = GenerationBudget.from_context(context, LESSON_SECTIONS)
+        produced = False
+        try:
+            for piece in self.stream_text(rest, prefix=prefix, budget=budget):
+                produced = True
+                yield piece
+        except Exception as exc:
+            if produced:
+                raise
+            log_event({"event": "lesson_plan.stream_failed", "model": self.model_id, "error": f"{type(exc).__name__}: {exc}"})
+        if not produced:
+            # deadline hit (or generation failed) before the first token
+            yield self._fallback_plan(context)
+
+    def batching_stats(self) -> Dict:
+        stats = self._batcher.stats() if self._batcher is not None else {}
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = {**self.prefix_cache.stats(), "errors": self.prefix_cache_errors}
+        elif self.prefix_cache_disabled:
+            stats["prefix_cache"] = {"disabled": self.prefix_cache_disabled, "errors": self.prefix_cache_errors}
+        return stats
+
+    def generate_lesson_plan(self, context: Dict, evidence: List[Dict]) -> str:
+        """Generate a plan within the context's budget (``max_new_tokens``, ``deadline_s``).
+
+        Generation stops early once all plan sections are written. A plan cut
+        off by the deadline is returned as-is if it got past its first
+        section heading; otherwise the template plan is returned.
+        """
+        if self.pipeline is None:
+            return self._fallback_plan(context)
+        prefix, rest = self._lesson_prompt(context, evidence)
+        budget = GenerationBudget.from_context(context, LESSON_SECTIONS)
+        text, reason = self.generate_with_budget(rest, prefix, budget)
+        if not text or (reason == "deadline" and LESSON_SECTIONS[0].lower() not in text.lower()):
+            return self._fallback_plan(context)
         return text
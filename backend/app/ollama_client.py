@@ -1,9 +1,14 @@
 import json
 import os
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, Iterator
 
 import requests
 
+from app.llm_pool import available as _pool_available, get_pool
+
+# keep-alive connections for the blocking client
+_session = requests.Session()
+
 SYSTEM_PROMPT = """You are **K-SASA**, a Kenyan national assistant.  
 ... (keep the full prompt exactly as it is) ...
 """
@@ -17,43 +22,31 @@ def _ollama_base_url() -> str:
     return os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 
 
-def ask_ksasa(user_message: str) -> Dict[str, Any]:
-    """Call Ollama (LLaMA 3.1 8B) with the K-SASA system prompt and return parsed JSON.
+def ollama_model() -> str:
+    return os.environ.get("OLLAMA_MODEL", "llama3.2:latest")
 
-    On JSON parse failure, return a dict with an `error` field and raw content.
-    """
+
+def _payload(user_message: str, stream: bool) -> Dict[str, Any]:
     prompt = f"""
 You are K-SASA, Kenyan national assistant.
 User query: "{user_message}"
 Follow the K-SASA OpenAPI JSON format rules.
 """
 
-    url = f"{_ollama_base_url().rstrip('/')}/api/chat"
-    payload: Dict[str, Any] = {
-        "model": os.environ.get("OLLAMA_MODEL", "llama3.2:latest"),
+    return {
+        "model": ollama_model(),
         "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
-        "stream": False,
+        "stream": stream,
         "options": {
             "temperature": 0.2,
         },
     }
 
-    try:
-        resp = requests.post(url, json=payload, timeout=60)
-    except Exception as exc:  # network / connection error
-        return {"error": f"Ollama request failed: {exc}"}
-
-    if resp.status_code != 200:
-        return {"error": f"Ollama HTTP {resp.status_code}: {resp.text}"}
-
-    try:
-        data = resp.json()
-    except Exception as exc:
-        return {"error": f"Invalid JSON from Ollama: {exc}", "raw": resp.text}
 
+def _parse_chat(data: Dict[str, Any]) -> Dict[str, Any]:
     # Expected Ollama chat format: { "message": {"content": "..."}, ... }
     content = ""
     try:
@@ -69,3 +62,96 @@ Follow the K-SASA OpenAPI JSON format rules.
         return json.loads(content)
     except Exception:
         return {"text": content}
+
+
+def ask_ksasa(user_message: str) -> Dict[str, Any]:
+    """Call Ollama (LLaMA 3.1 8B) with the K-SASA system prompt and return parsed JSON.
+
+    On JSON parse failure, return a dict with an `error` field and raw content.
+    """
+    url = f"{_ollama_base_url().rstrip('/')}/api/chat"
+    payload = _payload(user_message, stream=False)
+
+    try:
+        resp = _session.post(url, json=payload, timeout=60)
+    except Exception as exc:  # network / connection error
+        return {"error": f"Ollama request failed: {exc}"}
+
+    if resp.status_code != 200:
+        return {"error": f"Ollama HTTP {resp.status_code}: {resp.text}"}
+
+    try:
+        data = resp.json()
+    except Exception as exc:
+        return {"error": f"Invalid JSON from Ollama: {exc}", "raw": resp.text}
+
+    return _parse_chat(data)
+
+
+def stream_ksasa(user_message: str) -> Iterator[str]:
+    """Yield message content as Ollama streams it (one JSON object per line).
+
+    Raises RuntimeError if the request fails before streaming starts.
+    """
+    url = f"{_ollama_base_url().rstrip('/')}/api/chat"
+    try:
+        resp = _session.post(url, json=_payload(user_message, stream=True), stream=True, timeout=60)
+    except Exception as exc:  # network / connection error
+        raise RuntimeError(f"Ollama request failed: {exc}")
+
+    with resp:
+        if resp.status_code != 200:
+            raise RuntimeError(f"Ollama HTTP {resp.status_code}: {resp.text}")
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except Exception:
+                continue
+            content = (data.get("message") or {}).get("content")
+            if content:
+                yield content
+            if data.get("done"):
+                break
+
+
+async def ask_ksasa_async(user_message: str) -> Dict[str, Any]:
+    """Async ``ask_ksasa`` over the shared connection pool (K_SASA_OLLAMA_CONCURRENCY / _TIMEOUT)."""
+    if not _pool_available():
+        return await get_pool("ollama").run_in_thread(ask_ksasa, user_message)
+    url = f"{_ollama_base_url().rstrip('/')}/api/chat"
+
+    try:
+        resp = await get_pool("ollama").post_json(url, _payload(user_message, stream=False))
+    except Exception as exc:  # network / connection error / timeout
+        return {"error": f"Ollama request failed: {exc}"}
+
+    if resp.status_code != 200:
+        return {"error": f"Ollama HTTP {resp.status_code}: {resp.text}"}
+
+    try:
+        data = resp.json()
+    except Exception as exc:
+        return {"error": f"Invalid JSON from Ollama: {exc}", "raw": resp.text}
+
+    return _parse_chat(data)
+
+
+async def stream_ksasa_async(user_message: str) -> AsyncIterator[str]:
+    """Async ``stream_ksasa``: yield message content from Ollama's line-delimited JSON stream."""
+    if not _pool_available():
+        async for piece in get_pool("ollama").iterate_in_thread(stream_ksasa(user_message)):
+            yield piece
+        return
+    url = f"{_ollama_base_url().rstrip('/')}/api/chat"
+    async for line in get_pool("ollama").stream_lines(url, _payload(user_message, stream=True)):
+        try:
+            data = json.loads(line)
+        except Exception:
+            continue
+        content = (data.get("message") or {}).get("content")
+        if content:
+            yield content
+        if data.get("done"):
+            break
@@ -1,15 +1,17 @@
 import json
 import os
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, Iterator
 
 import openai
 
+from app.llm_pool import available as _pool_available, get_pool
+
 SYSTEM_PROMPT = """You are **K-SASA**, a Kenyan national assistant.  
 ... (keep the full prompt exactly as it is) ...
 """
 
 
-def _openai_model() -> str:
+def openai_model() -> str:
     """Return the OpenAI chat model name.
 
     Defaults to gpt-4o-mini but can be overridden with OPENAI_MODEL.
@@ -17,6 +19,35 @@ def _openai_model() -> str:
     return os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 
 
+def _messages(user_message: str):
+    prompt = f"""
+You are K-SASA, Kenyan national assistant.
+User query: "{user_message}"
+Follow the K-SASA OpenAPI JSON format rules.
+"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_reply(content: str) -> Dict[str, Any]:
+    """Parse the model's structured JSON reply; fall back to plain text."""
+    try:
+        data = json.loads(content)
+        if isinstance(data, dict):
+            # Ensure keys expected by /agent/ask exist at least as empty defaults
+            if "response" not in data:
+                data["response"] = ""
+            if "instructions" not in data:
+                data["instructions"] = []
+            return data
+    except Exception:
+        pass
+
+    return {"response": content, "instructions": []}
+
+
 def ask_ksasa(user_message: str) -> Dict[str, Any]:
     """Call OpenAI Chat Completions with the K-SASA system prompt.
 
@@ -32,19 +63,10 @@ def ask_ksasa(user_message: str) -> Dict[str, Any]:
 
     openai.api_key = api_key
 
-    prompt = f"""
-You are K-SASA, Kenyan national assistant.
-User query: "{user_message}"
-Follow the K-SASA OpenAPI JSON format rules.
-"""
-
     try:
         completion = openai.ChatCompletion.create(
-            model=_openai_model(),
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
+            model=openai_model(),
+            messages=_messages(user_message),
             temperature=0.2,
         )
     except Exception as exc:
@@ -55,17 +77,111 @@ Follow the K-SASA OpenAPI JSON format rules.
     except Exception:
         return {"error": "Invalid response format from OpenAI", "raw": completion}
 
-    # Try to parse structured JSON; if that fails, return plain text
+    return parse_reply(content)
+
+
+def stream_ksasa(user_message: str) -> Iterator[str]:
+    """Yield completion text deltas as OpenAI streams them.
+
+    Raises RuntimeError if the request cannot be started.
+    """
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+
+    openai.api_key = api_key
+
     try:
-        data = json.loads(content)
-        if isinstance(data, dict):
-            # Ensure keys expected by /agent/ask exist at least as empty defaults
-            if "response" not in data:
-                data["response"] = ""
-            if "instructions" not in data:
-                data["instructions"] = []
-            return data
+        chunks = openai.ChatCompletion.create(
+            model=openai_model(),
+            messages=_messages(user_message),
+            temperature=0.2,
+            stream=True,
+        )
+    except Exception as exc:
+        raise RuntimeError(f"OpenAI request failed: {exc}")
+
+    for chunk in chunks:
+        try:
+            content = chunk["choices"][0].get("delta", {}).get("content")
+        except Exception:
+            content = None
+        if content:
+            yield content
+
+
+def _api_base() -> str:
+    return os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+
+def _request(user_message: str, stream: bool) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "model": openai_model(),
+        "messages": _messages(user_message),
+        "temperature": 0.2,
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+async def ask_ksasa_async(user_message: str) -> Dict[str, Any]:
+    """Async ``ask_ksasa`` over the shared connection pool (K_SASA_OPENAI_CONCURRENCY / _TIMEOUT).
+
+    The API key is sent per request instead of being set on the global
+    ``openai`` module. Falls back to the blocking client in a thread, within the same
+    concurrency limit, if httpx is not installed.
+    """
+    if not _pool_available():
+        return await get_pool("openai").run_in_thread(ask_ksasa, user_message)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return {"error": "OPENAI_API_KEY is not set"}
+
+    try:
+        resp = await get_pool("openai").post_json(
+            f"{_api_base()}/chat/completions",
+            _request(user_message, stream=False),
+            headers={"Authorization": f"Bearer {api_key}"},
+        )
+    except Exception as exc:
+        return {"error": f"OpenAI request failed: {exc}"}
+    if resp.status_code != 200:
+        return {"error": f"OpenAI HTTP {resp.status_code}: {resp.text}"}
+
+    try:
+        completion = resp.json()
+        content = completion["choices"][0]["message"]["content"]
     except Exception:
-        pass
+        return {"error": "Invalid response format from OpenAI", "raw": resp.text}
+
+    return parse_reply(content)
+
+
+async def stream_ksasa_async(user_message: str) -> AsyncIterator[str]:
+    """Async ``stream_ksasa``: yield text deltas from the server-sent event stream."""
+    if not _pool_available():
+        async for piece in get_pool("openai").iterate_in_thread(stream_ksasa(user_message)):
+            yield piece
+        return
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set")
 
-    return {"response": content, "instructions": []}
\ No newline at end of file
+    lines = get_pool("openai").stream_lines(
+        f"{_api_base()}/chat/completions",
+        _request(user_message, stream=True),
+        headers={"Authorization": f"Bearer {api_key}"},
+    )
+    async for line in lines:
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            content = json.loads(data)["choices"][0].get("delta", {}).get("content")
+        except Exception:
+            content = None
+        if content:
+            yield content
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+try:
+    from pypdf import PdfReader  # type: ignore
+except Exception:  # pragma: no cover
+    PdfReader = None  # type: ignore
+try:
+    import fitz  # type: ignore  # PyMuPDF
+except Exception:  # pragma: no cover
+    fitz = None  # type: ignore
+
+PAGE_SEPARATOR = "\f"
+
+
+def available() -> bool:
+    return PdfReader is not None or fitz is not None
+
+
+def page_count(path: str) -> int:
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            return doc.page_count
+    return len(PdfReader(path).pages)
+
+
+def extract_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end). Runs in worker processes, so it opens the file itself."""
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            return [doc.load_page(i).get_text() or "" for i in range(start, end)]
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _cache_path(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"{digest}.txt")
+
+
+def _iter_cached(path: str) -> Iterator[str]:
+    buf = ""
+    with open(path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(1 << 16), ""):
+            buf += block
+            pages = buf.split(PAGE_SEPARATOR)
+            buf = pages.pop()
+            yield from pages
+    if buf:
+        yield buf
+
+
+def iter_pdf_pages(
+    path: str,
+    digest: str,
+    cache_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None,
+) -> Iterator[str]:
+    """Yield a PDF's pages in order, extracting page ranges in a process pool.
+
+    Extracted text is cached under ``cache_dir`` keyed by the file hash, so
+    an unchanged PDF is never parsed twice. Pages are yielded as soon as
+    their range finishes, letting the chunker and embedder run while later
+    pages are still being extracted.
+    """
+    if cache_dir:
+        cached = _cache_path(cache_dir, digest)
+        if os.path.exists(cached):
+            yield from _iter_cached(cached)
+            return
+
+    workers = workers or int(os.environ.get("K_SASA_PDF_WORKERS", "0")) or (os.cpu_count() or 1)
+    pages_per_task = pages_per_task or int(os.environ.get("K_SASA_PDF_PAGES_PER_TASK", "8"))
+    total = page_count(path)
+    ranges = [(i, min(i + pages_per_task, total)) for i in range(0, total, pages_per_task)]
+
+    out = None
+    tmp = None
+    if cache_dir:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = os.path.join(cache_dir, f".{digest}.{uuid.uuid4().hex[:8]}.tmp")
+            out = open(tmp, "w", encoding="utf-8")
+        except Exception:
+            out = None
+
+    first = True
+    try:
+        if len(ranges) <= 1 or workers <= 1:
+            results = (extract_pages(path, a, b) for a, b in ranges)
+            pool = None
+        else:
+            # spawn, not fork: the parent may hold FAISS/torch thread pools
+            pool = ProcessPoolExecutor(
+                max_workers=min(workers, len(ranges)), mp_context=multiprocessing.get_context("spawn")
+            )
+            results = pool.map(extract_pages, [path] * len(ranges), [a for a, _ in ranges], [b for _, b in ranges])
+        try:
+            for pages in results:
+                for text in pages:
+                    text = text.replace(PAGE_SEPARATOR, "\n")
+                    if out is not None:
+                        out.write(("" if first else PAGE_SEPARATOR) + text)
+                    first = False
+                    yield text
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        if out is not None:
+            out.close()
+            out = None
+            os.replace(tmp, _cache_path(cache_dir, digest))
+    finally:
+        if out is not None:
+            out.close()
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
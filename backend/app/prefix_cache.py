@@ -0,0 +1,153 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import psutil  # type: ignore
+except Exception:  # pragma: no cover
+    psutil = None  # type: ignore
+
+
+def _tensors(obj):
+    layers = getattr(obj, "layers", None)
+    if layers is not None:  # transformers Cache objects (per-layer keys/values)
+        for layer in layers:
+            for name in ("keys", "values"):
+                t = getattr(layer, name, None)
+                if t is not None:
+                    yield t
+        return
+    if hasattr(obj, "to_legacy_cache"):  # older transformers Cache objects
+        obj = obj.to_legacy_cache()
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            yield from _tensors(item)
+    elif obj is not None:
+        yield obj
+
+
+def cache_nbytes(past) -> int:
+    total = 0
+    for t in _tensors(past):
+        if hasattr(t, "element_size"):
+            total += t.numel() * t.element_size()
+        else:
+            total += int(getattr(t, "nbytes", 0))
+    return total
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of memory available to new allocations (psutil, else /proc/meminfo); None if unknown."""
+    if psutil is not None:
+        try:
+            return int(psutil.virtual_memory().available)
+        except Exception:
+            pass
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return None
+
+
+class PrefixKVCache:
+    """LRU of precomputed attention KV state for fixed prompt prefixes.
+
+    Entries map prefix text to ``(input_ids, past_key_values)``. The cache is
+    bounded by entry count and total KV bytes, and drops least-recently-used
+    entries while free system memory is below ``min_free_mb``.
+    """
+
+    def __init__(self, max_entries: int = 4, max_mb: float = 1024.0, min_free_mb: float = 512.0):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.min_free_bytes = int(min_free_mb * 1024 * 1024)
+        self._entries: "OrderedDict[str, Tuple[Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "PrefixKVCache":
+        return cls(
+            max_entries=int(os.environ.get("K_SASA_PREFIX_CACHE_SIZE", "4")),
+            max_mb=float(os.environ.get("K_SASA_PREFIX_CACHE_MB", "1024")),
+            min_free_mb=float(os.environ.get("K_SASA_PREFIX_CACHE_MIN_FREE_MB", "512")),
+        )
+
+    def get(self, prefix: str, build: Callable[[str], Tuple[Any, Any]]) -> Tuple[Any, Any]:
+        """Return ``(input_ids, past_key_values)`` for ``prefix``, computing them with ``build`` on a miss.
+
+        Callers must not mutate the returned state (copy the cache before generating).
+        """
+        with self._lock:
+            entry = self._entries.get(prefix)
+            if entry is not None:
+                self._entries.move_to_end(prefix)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+        ids, past = build(prefix)
+        size = cache_nbytes(past)
+        if size > self.max_bytes:
+            return ids, past  # too large to keep; use once
+        with self._lock:
+            if prefix not in self._entries:
+                self._entries[prefix] = (ids, past, size)
+                self.nbytes += size
+            self._shrink()
+        return ids, past
+
+    def _memory_tight(self) -> bool:
+        if not self.min_free_bytes:
+            return False
+        available = available_memory()
+        return available is not None and available < self.min_free_bytes
+
+    def _shrink(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes or self._memory_tight()
+        ):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after an out-of-memory error."""
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "mb": round(self.nbytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def copy_past(past: Optional[Any]):
+    """Per-request copy of cached KV state; generation appends to Cache objects in place."""
+    import copy
+
+    return copy.deepcopy(past)
+
+
+def expand_past(past, batch: int):
+    """Repeat a batch-of-one KV state ``batch`` times (in place for Cache objects)."""
+    if batch == 1:
+        return past
+    if hasattr(past, "batch_repeat_interleave"):
+        past.batch_repeat_interleave(batch)
+        return past
+    return tuple(tuple(t.repeat_interleave(batch, dim=0) for t in layer) for layer in past)
@@ -1,130 +1,815 @@
 import json
 import os
-from dataclasses import dataclass
-from typing import List, Tuple, Dict
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Set, Tuple, Dict
+
+from app.ann import (
+    SQ_RANGE,
+    ann_params,
+    build_ann_index,
+    dequantize_vectors,
+    quant_mode,
+    quantize_vectors,
+    resolve_index_type,
+    set_search_params,
+)
+from app import pdf_extract
+from app.bm25 import BM25Index
+from app.dedup import NearDuplicateIndex, simhash
+from app.ingest import batched, chunk_params, chunker_id, iter_chunks, iter_file_blocks, iter_sentences
+from app.rag_store import ChunkStore, IndexSnapshot, file_hash, load_snapshot, save_snapshot, text_hash
 
 try:
-    import faiss  # type: ignore
+    import numpy as np  # type: ignore
 except Exception:  # pragma: no cover
-    faiss = None  # type: ignore
+    np = None  # type: ignore
 try:
-    from sentence_transformers import SentenceTransformer
+    import faiss  # type: ignore
 except Exception:  # pragma: no cover
-    SentenceTransformer = None  # type: ignore
+    faiss = None  # type: ignore
+# sentence-transformers pulls in torch; it is imported by load_encoder() on first use
+SentenceTransformer = None  # type: ignore
+
+
+def load_encoder(model_name: str):
+    """Load the sentence embedding model, or return None if it is unavailable."""
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        try:
+            from sentence_transformers import SentenceTransformer as _SentenceTransformer
+        except Exception:  # pragma: no cover
+            return None
+        SentenceTransformer = _SentenceTransformer
+    try:
+        return SentenceTransformer(model_name)
+    except Exception:
+        return None
 
 
 @dataclass
 class DocChunk:
     text: str
     source: str
+    # further sources whose near-duplicate chunks were collapsed into this one
+    refs: List[str] = field(default_factory=list)
+
+
+# Seed file name prefix -> domain partition; anything else goes to "general"
+SEED_DOMAIN_PREFIXES = {
+    "curriculum": "education",
+    "moh": "health",
+    "clinic": "health",
+    "gov": "governance",
+}
+
+
+def seed_domain(source: str) -> str:
+    name = source.split(":", 1)[-1].lower()
+    for prefix, domain in SEED_DOMAIN_PREFIXES.items():
+        if name.startswith(prefix):
+            return domain
+    return "general"
+
+
+def _seed_documents(seed_dir: str) -> List[Tuple[str, str, str]]:
+    """List (source, path, kind) for every seed file the retriever knows how to read."""
+    docs: List[Tuple[str, str, str]] = []
+    json_path = os.path.join(seed_dir, "gov_form_business.json")
+    if os.path.exists(json_path):
+        docs.append(("seed:gov_form_business.json", json_path, "json"))
+    for name in ["curriculum_kiswahili.pdf", "moh_leaflet_kiswahili.pdf"]:
+        path = os.path.join(seed_dir, name)
+        if os.path.exists(path):
+            docs.append((f"seed:{name}", path, "pdf"))
+    try:
+        for fname in sorted(os.listdir(seed_dir)):
+            if fname.lower().endswith(".txt"):
+                docs.append((f"seed:{fname}", os.path.join(seed_dir, fname), "txt"))
+    except Exception:
+        pass
+    return docs
+
+
+def _document_blocks(path: str, kind: str, digest: str = "", cache_dir: Optional[str] = None) -> Iterator[str]:
+    """Yield a seed document's text in bounded blocks (one page at a time for PDFs)."""
+    if kind == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            yield json.dumps(json.load(f))
+    elif kind == "pdf":
+        if pdf_extract.available() and os.path.getsize(path) > 0:
+            for page in pdf_extract.iter_pdf_pages(path, digest or file_hash(path), cache_dir):
+                # keep a boundary between pages so sentences do not run across them
+                yield page + "\n"
+        else:
+            yield f"Placeholder content for {os.path.basename(path)}"
+    else:
+        yield from iter_file_blocks(path)
 
 
 class SimpleRetriever:
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.model = None
-        if SentenceTransformer is not None:
-            try:
-                self.model = SentenceTransformer(model_name)
-            except Exception:
-                self.model = None
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        index_dir: Optional[str] = None,
+        index_type: Optional[str] = None,
+        model=None,
+        load_model: bool = True,
+    ):
+        self.model_name = model_name
+        # A shared encoder may be passed in (PartitionedRetriever loads it once for all partitions)
+        self.model = model
+        if self.model is None and load_model:
+            self.model = load_encoder(model_name)
+        # Persisted index location; set K_SASA_INDEX_DIR="" to disable persistence
+        self.index_dir = index_dir if index_dir is not None else os.environ.get("K_SASA_INDEX_DIR", "/app/index")
+        # Compact once this fraction of stored chunks are tombstones
+        self.compact_ratio = float(os.environ.get("K_SASA_RAG_COMPACT_RATIO", "0.25"))
+        self.chunking = chunk_params()
+        self.chunker_id = chunker_id(self.chunking)
+        # flat | ivf_flat | hnsw | ivf_pq | auto (chosen by corpus size)
+        self.index_type = index_type or os.environ.get("K_SASA_RAG_INDEX", "auto")
+        self.ann_params = ann_params()
+        # none | sq8 | pq: how vectors are stored in the index and on disk
+        self.quant = quant_mode()
+        self.built_index_type: Optional[str] = None
         self.index = None
-        self.chunks: List[DocChunk] = []
+        self.vectors = None
+        self.store = ChunkStore()
+        # source -> {"hash", "start", "end", "origin"}; rows of the live version of each document
+        self.docs: Dict[str, Dict] = {}
+        # rows whose document was deleted or replaced, filtered out until the next compaction
+        self.deleted: Set[int] = set()
+        # Chunks within this SimHash Hamming distance collapse into one row (0 = exact duplicates only)
+        self.dedup_bits = int(os.environ.get("K_SASA_RAG_DEDUP_BITS", "3"))
+        self.dedup = os.environ.get("K_SASA_RAG_DEDUP", "1") == "1" and self.dedup_bits >= 0
+        self._near: Optional[NearDuplicateIndex] = None
+        self._bm25: Optional[BM25Index] = None
+        self._index_shared = False
+        self._compacting = False
+        self._lock = threading.RLock()
+        # Ingests persist in the background; a burst within this many seconds is written as one snapshot
+        self.save_delay_s = float(os.environ.get("K_SASA_RAG_SAVE_DELAY_S", "1.0"))
+        self._dirty = False
+        self._saver: Optional[threading.Thread] = None
+        self._save_lock = threading.Lock()
 
-    def build_from_seed(self, seed_dir: str):
-        texts: List[str] = []
-        metas: List[str] = []
+    def _vector_mode(self) -> bool:
+        return self.model is not None and faiss is not None and np is not None
 
-        # JSON seed
-        json_path = os.path.join(seed_dir, "gov_form_business.json")
-        if os.path.exists(json_path):
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                texts.append(json.dumps(data))
-                metas.append("seed:gov_form_business.json")
-            except Exception:
-                pass
+    def _embed(self, texts: List[str]):
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype="float32")
 
-        # PDFs (placeholder read as filenames)
-        for name in ["curriculum_kiswahili.pdf", "moh_leaflet_kiswahili.pdf"]:
-            path = os.path.join(seed_dir, name)
-            if os.path.exists(path):
-                try:
-                    # NOTE: keep simple placeholder; integrate PDF parsing later
-                    texts.append(f"Placeholder content for {name}")
-                    metas.append(f"seed:{name}")
-                except Exception:
-                    pass
+    def _stored(self, vectors):
+        """Vectors in the storage dtype (int8 when quantization is enabled)."""
+        return quantize_vectors(vectors, self.quant)
+
+    def _resolve_index_type(self, n: int) -> str:
+        return resolve_index_type(self.index_type, n, self.ann_params)
+
+    def _build_index(self, vectors, rows: Optional[List[int]] = None):
+        kind = self._resolve_index_type(len(vectors))
+        ids = np.arange(len(vectors), dtype="int64") if rows is None else np.asarray(rows, dtype="int64")
+        index = build_ann_index(dequantize_vectors(vectors), ids, kind, self.ann_params, self.quant)
+        self.built_index_type = kind
+        return index
 
-        # TXT notes (read contents)
+    def _live_rows(self) -> List[int]:
+        return [r for r in range(len(self.store)) if r not in self.deleted]
+
+    def _pdf_cache_dir(self) -> Optional[str]:
+        cache_dir = os.environ.get("K_SASA_PDF_CACHE_DIR")
+        if cache_dir is None and self.index_dir:
+            cache_dir = os.path.join(self.index_dir, "pdf_text")
+        return cache_dir or None
+
+    def _chunks(self, blocks: Iterable[str]) -> Iterator[str]:
+        return iter_chunks(
+            iter_sentences(blocks),
+            max_tokens=self.chunking["max_tokens"],
+            overlap_tokens=self.chunking["overlap_tokens"],
+        )
+
+    def _dedup_id(self) -> Optional[int]:
+        return self.dedup_bits if self.dedup else None
+
+    def _snapshot_matches(self, snapshot: IndexSnapshot, hashes: Dict[str, str]) -> bool:
+        manifest = snapshot.manifest
+        if manifest.get("chunker") != self.chunker_id or manifest.get("dedup") != self._dedup_id():
+            return False
+        seed_docs = {s: d for s, d in manifest.get("docs", {}).items() if d.get("origin", "seed") == "seed"}
+        if set(seed_docs) != set(hashes):
+            return False
+        if any(seed_docs[s].get("hash") != h for s, h in hashes.items()):
+            return False
+        if self._vector_mode():
+            return (
+                manifest.get("model") == self.model_name
+                and manifest.get("quant", "none") == self.quant
+                and snapshot.vectors is not None
+            )
+        return True
+
+    def _adopt(self, snapshot: IndexSnapshot) -> bool:
+        """Switch to ``snapshot``; returns True if its index had to be rebuilt."""
+        rebuilt = False
+        with self._lock:
+            self.store = snapshot.store
+            self.docs = dict(snapshot.manifest.get("docs", {}))
+            self.deleted = set(snapshot.manifest.get("deleted", []))
+            self.vectors = snapshot.vectors if self._vector_mode() else None
+            self.index = None
+            self._bm25 = None
+            self._near = None
+            # An index read from disk may be memory-mapped read-only; copy it before the first write
+            self._index_shared = True
+            if self.vectors is not None and len(self.store):
+                live = self._live_rows()
+                self.index = snapshot.index
+                self.built_index_type = snapshot.manifest.get("index_type", "flat")
+                if self.index is not None:
+                    set_search_params(self.index, self.ann_params)
+                # Rebuild when the configured (or size-chosen) index type differs from the stored one
+                stale_sq = self.quant == "sq8" and snapshot.manifest.get("sq_range") != SQ_RANGE
+                if live and (
+                    self.index is None or stale_sq or self.built_index_type != self._resolve_index_type(len(live))
+                ):
+                    try:
+                        self.index = self._build_index(self.vectors[live], live)
+                        self._index_shared = False
+                        rebuilt = True
+                    except Exception:
+                        self.index = None
+            if self.index is None:
+                # Keyword-only deployments build the inverted index at load, not on the first query
+                self._keyword_index()
+        return rebuilt
+
+    def _snapshot(self) -> IndexSnapshot:
+        """Copy of the live state (caller holds the lock); ingestion may continue while it is written."""
+        index = self.index
+        if index is not None:
+            index = faiss.clone_index(index)
+        return IndexSnapshot(
+            {
+                "chunker": self.chunker_id,
+                "dedup": self._dedup_id(),
+                "model": self.model_name if self.vectors is not None else None,
+                "quant": self.quant,
+                "sq_range": SQ_RANGE,
+                "index_type": self.built_index_type,
+                "docs": {s: {**d, "dups": list(d.get("dups", []))} for s, d in self.docs.items()},
+                "deleted": sorted(self.deleted),
+            },
+            self.store.copy(),
+            self.vectors,  # replaced, never modified in place
+            index,
+        )
+
+    def _persist(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        if not self.index_dir:
+            return snapshot
         try:
-            for fname in os.listdir(seed_dir):
-                if fname.lower().endswith(".txt"):
-                    p = os.path.join(seed_dir, fname)
-                    with open(p, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    texts.append(content)
-                    metas.append(f"seed:{fname}")
+            save_snapshot(self.index_dir, snapshot)
+            # Re-open from disk so this worker maps the shared files instead of keeping a private copy
+            loaded = load_snapshot(self.index_dir)
+            if loaded is not None:
+                return loaded
         except Exception:
             pass
+        return snapshot
 
-        # Chunk (simple)
-        chunks: List[DocChunk] = []
-        for t, m in zip(texts, metas):
-            for i in range(0, len(t), 400):
-                piece = t[i : i + 400]
-                if piece.strip():
-                    chunks.append(DocChunk(text=piece, source=m))
+    def save(self):
+        """Persist the current chunks, vectors and tombstones to the index directory.
 
-        if not chunks:
-            self.index = None
-            self.chunks = []
+        The state is copied under the lock and written outside it; the live
+        index and keyword index stay in use.
+        """
+        if not self.index_dir:
+            return
+        with self._save_lock:
+            with self._lock:
+                self._dirty = False
+                snapshot = self._snapshot()
+            try:
+                save_snapshot(self.index_dir, snapshot)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+
+    def _schedule_save(self):
+        if not self.index_dir:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._saver is None:
+                self._saver = threading.Thread(target=self._save_later, name="rag-save", daemon=True)
+                self._saver.start()
+
+    def _save_later(self):
+        while True:
+            time.sleep(self.save_delay_s)
+            with self._lock:
+                if not self._dirty:
+                    self._saver = None
+                    return
+            self.save()
+
+    def flush(self):
+        """Write pending ingests now (e.g. at shutdown)."""
+        if self._dirty:
+            self.save()
+
+    def build_from_seed(self, seed_dir: str, domain: Optional[str] = None):
+        """Load the persisted index for ``seed_dir`` and re-embed only files whose hash changed.
+
+        With ``domain`` set, only seed files of that partition are indexed.
+        Documents ingested through ``add_document`` are carried over unchanged.
+        """
+        docs = _seed_documents(seed_dir)
+        if domain is not None:
+            docs = [d for d in docs if seed_domain(d[0]) == domain]
+        hashes: Dict[str, str] = {}
+        for source, path, _ in docs:
+            try:
+                hashes[source] = file_hash(path)
+            except Exception:
+                pass
+
+        snapshot = None
+        if self.index_dir:
+            snapshot = load_snapshot(self.index_dir)
+        if snapshot is not None and self._snapshot_matches(snapshot, hashes):
+            if self._adopt(snapshot):
+                self.save()
             return
 
-        # If embedding stack available, build vector index; else fallback to simple mode
-        if self.model is not None and faiss is not None:
+        # Files are reusable only if the snapshot was embedded with the same model and chunker
+        reusable = (
+            snapshot is not None
+            and snapshot.manifest.get("chunker") == self.chunker_id
+            and (not self._vector_mode() or (
+                snapshot.manifest.get("model") == self.model_name and snapshot.vectors is not None
+            ))
+        )
+        vector_mode = self._vector_mode()
+        store = ChunkStore()
+        near = NearDuplicateIndex(self.dedup_bits) if self.dedup else None
+        blocks = []
+        manifest_docs: Dict[str, Dict] = {}
+
+        def place(text: str, source: str, dups: List[int], fingerprint: Optional[int] = None) -> bool:
+            """Append ``text`` as a new row, or collapse it into a near-duplicate; True if appended."""
+            fp = fingerprint or (simhash(text) if near is not None else 0)
+            if near is not None and fp:
+                row = near.find(fp)
+                if row is not None:
+                    if store.source(row) != source and store.add_ref(row, source):
+                        dups.append(row)
+                    return False
+            row = store.append(text, source, fp)
+            if near is not None and fp:
+                near.add(row, fp)
+            return True
+
+        def reuse(source: str, prev: Dict) -> Dict:
+            start, dups, keep = len(store), [], []
+            for row in list(range(int(prev["start"]), int(prev["end"]))) + list(prev.get("dups", [])):
+                if place(snapshot.store.text(row), source, dups, snapshot.store.fingerprints[row]):
+                    keep.append(row)
+            if vector_mode and keep:
+                blocks.append(self._stored(snapshot.vectors[keep]))
+            return {**prev, "start": start, "end": len(store), "dups": dups}
+
+        for source, path, kind in docs:
+            if source not in hashes:
+                continue
+            prev = snapshot.manifest["docs"].get(source) if reusable else None
+            if prev and prev.get("hash") == hashes[source]:
+                manifest_docs[source] = reuse(source, prev)
+                continue
+            # Stream the file through the chunker and embed new (non-duplicate) chunks in bounded batches
+            start, dups, n_blocks = len(store), [], len(blocks)
             try:
-                embeddings = self.model.encode([c.text for c in chunks], normalize_embeddings=True)
-                dim = embeddings.shape[1]
-                index = faiss.IndexFlatIP(dim)
-                index.add(embeddings)
-                self.index = index
+                blocks_iter = _document_blocks(path, kind, hashes[source], self._pdf_cache_dir())
+                for batch in batched(self._chunks(blocks_iter), self.chunking["embed_batch"]):
+                    fresh = [piece for piece in batch if place(piece, source, dups)]
+                    if vector_mode and fresh:
+                        try:
+                            blocks.append(self._stored(self._embed(fresh)))
+                        except Exception:
+                            vector_mode = False
             except Exception:
-                self.index = None
-        else:
-            self.index = None
-        self.chunks = chunks
+                for row in dups:
+                    store.remove_ref(row, source)
+                store.truncate(start)
+                del blocks[n_blocks:]
+                continue
+            manifest_docs[source] = {
+                "hash": hashes[source], "start": start, "end": len(store), "dups": dups, "origin": "seed",
+            }
+
+        if reusable:
+            for source, prev in snapshot.manifest.get("docs", {}).items():
+                if prev.get("origin") == "api":
+                    manifest_docs[source] = reuse(source, prev)
+
+        vectors = np.vstack(blocks) if vector_mode and blocks else None
+        index = None
+        if vectors is not None:
+            try:
+                index = self._build_index(vectors)
+            except Exception:
+                index = None
+        built = IndexSnapshot(
+            {
+                "chunker": self.chunker_id,
+                "dedup": self._dedup_id(),
+                "model": self.model_name if vectors is not None else None,
+                "quant": self.quant,
+                "sq_range": SQ_RANGE,
+                "index_type": self.built_index_type if index is not None else None,
+                "docs": manifest_docs,
+                "deleted": [],
+            },
+            store,
+            vectors,
+            index,
+        )
+        self._adopt(self._persist(built))
+
+    # --- incremental ingestion -------------------------------------------------
+
+    def _writable_index(self):
+        if self._index_shared and self.index is not None:
+            try:
+                self.index = faiss.clone_index(self.index)
+                set_search_params(self.index, self.ann_params)
+            except Exception:
+                live = self._live_rows()
+                self.index = self._build_index(self.vectors[live], live) if live else None
+            self._index_shared = False
+        return self.index
+
+    def _near_index(self) -> Optional[NearDuplicateIndex]:
+        if not self.dedup:
+            return None
+        if self._near is None:
+            near = NearDuplicateIndex(self.dedup_bits)
+            for row, fp in enumerate(self.store.fingerprints):
+                if fp and row not in self.deleted:
+                    near.add(row, fp)
+            self._near = near
+        return self._near
+
+    def _tombstone(self, source: str):
+        prev = self.docs.pop(source, None)
+        if not prev:
+            return
+        dead: List[int] = []
+        for row in list(range(int(prev["start"]), int(prev["end"]))) + list(prev.get("dups", [])):
+            if self.store.source(row) != source:
+                self.store.remove_ref(row, source)
+                continue
+            others = self.store.ref_sources(row)
+            if others:
+                # Another live document shares this chunk: keep the row and hand it over
+                self.store.remove_ref(row, others[0])
+                self.store.set_source(row, others[0])
+            else:
+                dead.append(row)
+        self.deleted.update(dead)
+        if self._bm25 is not None:
+            for row in dead:
+                self._bm25.remove(row, self.store.text(row))
+        if self._near is not None:
+            for row in dead:
+                self._near.remove(row)
+        index = self._writable_index()
+        if index is not None and dead:
+            try:
+                index.remove_ids(np.asarray(dead, dtype="int64"))
+            except Exception:
+                pass  # index type without removal support; tombstones filter results
+
+    def add_document(self, doc_id: str, text: str, persist: bool = True) -> Dict:
+        """Add or replace one document without rebuilding the rest of the index.
+
+        Chunks that near-duplicate an indexed chunk are not embedded; the
+        existing row is attributed to ``doc_id`` as well. A replaced
+        document's old chunks are tombstoned and reclaimed by ``compact``.
+        With ``persist`` the change is saved in the background shortly after.
+        """
+        digest = text_hash(text)
+        prev = self.docs.get(doc_id)
+        if prev and prev.get("hash") == digest:
+            return {"doc_id": doc_id, "status": "unchanged", "chunks": self._doc_chunks(prev)}
+        pieces = list(self._chunks([text]))
+        fps = [simhash(p) if self.dedup else 0 for p in pieces]
+        vector_mode = self._vector_mode() and (self.vectors is not None or not len(self.store))
+
+        # Plan under the lock, embed outside it so searches keep running during ingestion
+        vecs: Dict[int, object] = {}
+        with self._lock:
+            near = self._near_index()
+            to_embed = []
+            for i, fp in enumerate(fps):
+                row = near.find(fp) if near is not None and fp else None
+                if row is None:
+                    to_embed.append(i)
+                elif self.store.source(row) == doc_id and vector_mode and self.vectors is not None:
+                    # unchanged chunk of the document being replaced: reuse its vector
+                    vecs[i] = dequantize_vectors(self.vectors[row : row + 1])
+        if vector_mode and to_embed:
+            for batch in batched(to_embed, self.chunking["embed_batch"]):
+                for i, v in zip(batch, self._embed([pieces[i] for i in batch])):
+                    vecs[i] = v[None, :]
+
+        with self._lock:
+            self._tombstone(doc_id)
+            near = self._near_index()
+            start, dups, new_vectors = len(self.store), [], []
+            for i, (piece, fp) in enumerate(zip(pieces, fps)):
+                row = near.find(fp) if near is not None and fp else None
+                if row is not None:
+                    if self.store.source(row) != doc_id and self.store.add_ref(row, doc_id):
+                        dups.append(row)
+                    continue
+                row = self.store.append(piece, doc_id, fp)
+                if near is not None and fp:
+                    near.add(row, fp)
+                if vector_mode:
+                    new_vectors.append(vecs[i] if i in vecs else self._embed([piece]))
+            if new_vectors:
+                new_vectors = np.vstack(new_vectors)
+                rows = list(range(start, len(self.store)))
+                stored = self._stored(new_vectors)
+                if self.vectors is None:
+                    self.vectors = stored
+                else:
+                    self.vectors = np.vstack([np.asarray(self.vectors), stored])
+                index = self._writable_index()
+                if index is None:
+                    self.index = self._build_index(new_vectors, rows)
+                else:
+                    index.add_with_ids(new_vectors, np.asarray(rows, dtype="int64"))
+            if self._bm25 is not None:
+                for row in range(start, len(self.store)):
+                    self._bm25.add(row, self.store.text(row))
+            self.docs[doc_id] = {
+                "hash": digest, "start": start, "end": len(self.store), "dups": dups, "origin": "api",
+            }
+            self._maybe_compact()
+        if persist:
+            self._schedule_save()
+        return {
+            "doc_id": doc_id,
+            "status": "updated" if prev else "added",
+            "chunks": len(self.store) - start + len(dups),
+            "duplicates": len(pieces) - (len(self.store) - start),
+        }
+
+    def delete_document(self, doc_id: str, persist: bool = True) -> bool:
+        with self._lock:
+            if doc_id not in self.docs:
+                return False
+            self._tombstone(doc_id)
+            self._maybe_compact()
+        if persist:
+            self._schedule_save()
+        return True
+
+    @staticmethod
+    def _doc_chunks(d: Dict) -> int:
+        return int(d["end"]) - int(d["start"]) + len(d.get("dups", []))
+
+    def list_documents(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"doc_id": s, "origin": d.get("origin", "seed"), "hash": d.get("hash"),
+                 "chunks": self._doc_chunks(d), "shared_chunks": len(d.get("dups", []))}
+                for s, d in self.docs.items()
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents": len(self.docs),
+                "chunks": len(self.store),
+                "tombstones": len(self.deleted),
+                "shared_chunks": len(self.store.refs),
+                "vector_index": self.index is not None,
+            }
+
+    def compact(self):
+        """Drop tombstoned chunks, renumber rows and rebuild the index from stored vectors."""
+        with self._lock:
+            try:
+                if not self.deleted:
+                    return
+                store = ChunkStore()
+                remap: Dict[int, int] = {}
+
+                def copy(row: int):
+                    new = store.append(self.store.text(row), self.store.source(row), self.store.fingerprints[row])
+                    for ref in self.store.ref_sources(row):
+                        store.add_ref(new, ref)
+                    remap[row] = new
+
+                docs: Dict[str, Dict] = {}
+                for source, d in self.docs.items():
+                    start = len(store)
+                    for row in range(int(d["start"]), int(d["end"])):
+                        copy(row)
+                    docs[source] = {**d, "start": start, "end": len(store)}
+                # rows handed over to a document that only referenced them
+                for row in range(len(self.store)):
+                    if row not in remap and row not in self.deleted:
+                        copy(row)
+                for d in docs.values():
+                    d["dups"] = [remap[r] for r in d.get("dups", []) if r in remap]
+                live = sorted(remap, key=remap.get)
+                vectors = None
+                index = None
+                if self.vectors is not None and live:
+                    vectors = np.asarray(self.vectors[live])
+                    index = self._build_index(vectors)
+                self.store, self.docs, self.deleted = store, docs, set()
+                self.vectors, self.index = vectors, index
+                self._bm25 = None
+                self._near = None
+                self._index_shared = False
+                if self.index is None:
+                    self._keyword_index()
+            finally:
+                self._compacting = False
+
+    def _maybe_compact(self):
+        if self._compacting or not len(self.store):
+            return
+        if len(self.deleted) / float(len(self.store)) < self.compact_ratio:
+            return
+        self._compacting = True
+
+        def run():
+            self.compact()
+            self.save()
+
+        threading.Thread(target=run, name="rag-compact", daemon=True).start()
+
+    # --- search ----------------------------------------------------------------
+
+    def _keyword_index(self) -> BM25Index:
+        # With a vector index this is only needed if vector search fails, so build it lazily
+        if self._bm25 is None:
+            self._bm25 = BM25Index.build(
+                (row, self.store.text(row)) for row in range(len(self.store)) if row not in self.deleted
+            )
+        return self._bm25
+
+    def _chunk(self, row: int) -> DocChunk:
+        return DocChunk(text=self.store.text(row), source=self.store.source(row), refs=self.store.ref_sources(row))
 
     def retrieve(self, query: str, k: int = 4) -> List[Tuple[DocChunk, float]]:
-        if not self.chunks:
+        return self.retrieve_many([query], k)[0]
+
+    def retrieve_many(self, queries: List[str], k: int = 4) -> List[List[Tuple[DocChunk, float]]]:
+        """Retrieve for several queries with one encode batch and one index search."""
+        if not queries:
             return []
-        # Vector search path if available
+        q = None
         if self.index is not None and self.model is not None:
+            # Encoding is the expensive part; keep it outside the lock
             try:
-                q = self.model.encode([query], normalize_embeddings=True)
-                scores, idxs = self.index.search(q, k)
-                out: List[Tuple[DocChunk, float]] = []
-                for i, s in zip(idxs[0], scores[0]):
-                    if i == -1:
-                        continue
-                    out.append((self.chunks[i], float(s)))
-                return out
+                q = self._embed(list(queries))
             except Exception:
-                pass
-        # Fallback: simple keyword overlap scoring
-        q_tokens = set([w.lower() for w in query.split() if w.strip()])
-        scored: List[Tuple[int, float]] = []
-        for idx, ch in enumerate(self.chunks):
-            t_tokens = set([w.lower() for w in ch.text.split() if w.strip()])
-            inter = q_tokens.intersection(t_tokens)
-            score = float(len(inter)) / float(len(q_tokens) or 1)
-            scored.append((idx, score))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        top = scored[:k]
-        out: List[Tuple[DocChunk, float]] = []
-        for i, s in top:
-            out.append((self.chunks[i], float(s)))
-        return out
+                q = None
+        with self._lock:
+            if len(self.store) <= len(self.deleted):
+                return [[] for _ in queries]
+            # Vector search path if available
+            if q is not None and self.index is not None:
+                try:
+                    # Over-fetch so tombstones the index could not drop do not shrink the result
+                    fetch = min(len(self.store), k + len(self.deleted))
+                    scores, idxs = self.index.search(q, fetch)
+                    results: List[List[Tuple[DocChunk, float]]] = []
+                    for row_ids, row_scores in zip(idxs, scores):
+                        out: List[Tuple[DocChunk, float]] = []
+                        for i, s in zip(row_ids, row_scores):
+                            if i == -1 or int(i) in self.deleted:
+                                continue
+                            out.append((self._chunk(int(i)), float(s)))
+                            if len(out) >= k:
+                                break
+                        results.append(out)
+                    return results
+                except Exception:
+                    pass
+            # Fallback: BM25 over the inverted index
+            bm25 = self._keyword_index()
+            return [
+                [(self._chunk(row), float(score)) for row, score in bm25.search(query, k, exclude=self.deleted)]
+                for query in queries
+            ]
+
+
+class PartitionedRetriever:
+    """One SimpleRetriever (and index) per domain, sharing a single encoder.
+
+    Queries for a domain only search that domain's partition plus the small
+    "general" partition, so education queries never scan health leaflets.
+    """
+
+    def __init__(
+        self,
+        domains: List[str],
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        index_dir: Optional[str] = None,
+        load_model: bool = True,
+    ):
+        # load_model=False defers the encoder to load_model(), e.g. from a warm-up thread
+        self.model_name = model_name
+        model = load_encoder(model_name) if load_model else None
+        root = index_dir if index_dir is not None else os.environ.get("K_SASA_INDEX_DIR", "/app/index")
+        self.partitions: Dict[str, SimpleRetriever] = {}
+        for domain in list(dict.fromkeys(list(domains) + ["general"])):
+            self.partitions[domain] = SimpleRetriever(
+                model_name, index_dir=os.path.join(root, domain) if root else "", model=model, load_model=False
+            )
+
+    def load_model(self) -> bool:
+        model = load_encoder(self.model_name)
+        for part in self.partitions.values():
+            part.model = model
+        return model is not None
+
+    def for_domain(self, domain: str) -> Optional[SimpleRetriever]:
+        return self.partitions.get(domain)
+
+    def build_from_seed(self, seed_dir: str):
+        for domain, part in self.partitions.items():
+            part.build_from_seed(seed_dir, domain=domain)
+
+    def _targets(self, domain: Optional[str]) -> List[SimpleRetriever]:
+        if not domain:
+            return list(self.partitions.values())
+        targets = [p for d, p in self.partitions.items() if d == domain]
+        general = self.partitions.get("general")
+        if general is not None and domain != "general" and len(general.docs):
+            targets.append(general)
+        return targets
+
+    def retrieve(self, query: str, k: int = 4, domain: Optional[str] = None) -> List[Tuple[DocChunk, float]]:
+        return self.retrieve_many([query], k, domain)[0]
+
+    def retrieve_many(
+        self, queries: List[str], k: int = 4, domain: Optional[str] = None
+    ) -> List[List[Tuple[DocChunk, float]]]:
+        targets = self._targets(domain)
+        if len(targets) == 1:
+            return targets[0].retrieve_many(queries, k)
+        merged: List[List[Tuple[DocChunk, float]]] = [[] for _ in queries]
+        for part in targets:
+            for out, hits in zip(merged, part.retrieve_many(queries, k)):
+                out.extend(hits)
+        return [sorted(out, key=lambda x: x[1], reverse=True)[:k] for out in merged]
+
+    def add_document(self, doc_id: str, text: str, domain: str, persist: bool = True) -> Dict:
+        part = self.partitions.get(domain)
+        if part is None:
+            return {"error": f"unknown domain: {domain}"}
+        # A document lives in exactly one partition; moving it drops the old copy
+        for other_domain, other in self.partitions.items():
+            if other_domain != domain and doc_id in other.docs:
+                other.delete_document(doc_id, persist=persist)
+        return {**part.add_document(doc_id, text, persist=persist), "domain": domain}
+
+    def delete_document(self, doc_id: str, domain: Optional[str] = None, persist: bool = True) -> bool:
+        deleted = False
+        parts = list(self.partitions.values()) if not domain else [self.partitions[domain]] if domain in self.partitions else []
+        for part in parts:
+            deleted = part.delete_document(doc_id, persist=persist) or deleted
+        return deleted
+
+    def list_documents(self) -> List[Dict]:
+        return [{**doc, "domain": d} for d, part in self.partitions.items() for doc in part.list_documents()]
+
+    def stats(self) -> Dict:
+        return {d: part.stats() for d, part in self.partitions.items()}
+
+    def compact(self):
+        for part in self.partitions.values():
+            part.compact()
+
+    def save(self):
+        for part in self.partitions.values():
+            part.save()
+
+    def flush(self):
+        for part in self.partitions.values():
+            part.flush()
 
 
 def format_citations(retrieved: List[Tuple[DocChunk, float]]) -> List[Dict]:
@@ -134,5 +819,6 @@ def format_citations(retrieved: List[Tuple[DocChunk, float]]) -> List[Dict]:
             "source": chunk.source,
             "snippet": chunk.text[:200],
             "score": score,
+            "refs": list(chunk.refs),
         })
     return cites
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import uuid
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+TEXT_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.off"
+SOURCE_IDS_FILE = "chunks.src"
+SOURCES_FILE = "sources.json"
+FINGERPRINTS_FILE = "chunks.sim"
+REFS_FILE = "chunks.refs.json"
+CURRENT_FILE = "CURRENT"
+STORE_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkStore:
+    """Array-backed chunk storage: one UTF-8 buffer, row offsets and interned source ids.
+
+    A loaded store keeps the text buffer memory-mapped, so workers sharing an
+    index directory share its pages instead of each holding a copy.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._offsets = array("q", [0])
+        self._source_ids = array("i")
+        # SimHash per row, used for near-duplicate detection at ingest
+        self.fingerprints = array("Q")
+        # row -> further source ids whose near-duplicate chunks were collapsed into this row
+        self.refs: Dict[int, List[int]] = {}
+        self.sources: List[str] = []
+        self._source_lookup: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._source_ids)
+
+    def _writable(self):
+        if not isinstance(self._buf, bytearray):
+            self._buf = bytearray(self._buf)
+
+    def intern_source(self, source: str) -> int:
+        sid = self._source_lookup.get(source)
+        if sid is None:
+            sid = len(self.sources)
+            self.sources.append(source)
+            self._source_lookup[source] = sid
+        return sid
+
+    def append(self, text: str, source: str, fingerprint: int = 0) -> int:
+        self._writable()
+        data = text.encode("utf-8")
+        self._buf.extend(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._source_ids.append(self.intern_source(source))
+        self.fingerprints.append(fingerprint)
+        return len(self._source_ids) - 1
+
+    def set_source(self, row: int, source: str):
+        self._source_ids[row] = self.intern_source(source)
+
+    def add_ref(self, row: int, source: str) -> bool:
+        """Attribute ``row`` to another source as well; False if it already is."""
+        sid = self.intern_source(source)
+        refs = self.refs.setdefault(row, [])
+        if sid == self._source_ids[row] or sid in refs:
+            return False
+        refs.append(sid)
+        return True
+
+    def remove_ref(self, row: int, source: str):
+        sid = self._source_lookup.get(source)
+        refs = self.refs.get(row)
+        if refs and sid in refs:
+            refs.remove(sid)
+            if not refs:
+                del self.refs[row]
+
+    def ref_sources(self, row: int) -> List[str]:
+        return [self.sources[sid] for sid in self.refs.get(row, ())]
+
+    def copy(self) -> "ChunkStore":
+        """Independent copy, e.g. to write a snapshot while ingestion continues."""
+        store = ChunkStore()
+        # a memory-mapped buffer is never written in place (see _writable), so it can be shared
+        store._buf = self._buf if isinstance(self._buf, mmap.mmap) else bytes(self._buf)
+        store._offsets = array("q", self._offsets)
+        store._source_ids = array("i", self._source_ids)
+        store.fingerprints = array("Q", self.fingerprints)
+        store.refs = {row: list(sids) for row, sids in self.refs.items()}
+        store.sources = list(self.sources)
+        store._source_lookup = dict(self._source_lookup)
+        return store
+
+    def truncate(self, rows: int):
+        """Drop rows from ``rows`` onwards (used to roll back a partially ingested file)."""
+        if rows >= len(self):
+            return
+        self._writable()
+        del self._buf[self._offsets[rows]:]
+        del self._offsets[rows + 1:]
+        del self._source_ids[rows:]
+        del self.fingerprints[rows:]
+        for row in [r for r in self.refs if r >= rows]:
+            del self.refs[row]
+
+    def text(self, row: int) -> str:
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return bytes(self._buf[start:end]).decode("utf-8")
+
+    def source(self, row: int) -> str:
+        return self.sources[self._source_ids[row]]
+
+    def save(self, path: str):
+        with open(os.path.join(path, TEXT_FILE), "wb") as f:
+            f.write(self._buf)
+        with open(os.path.join(path, OFFSETS_FILE), "wb") as f:
+            self._offsets.tofile(f)
+        with open(os.path.join(path, SOURCE_IDS_FILE), "wb") as f:
+            self._source_ids.tofile(f)
+        with open(os.path.join(path, SOURCES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, ensure_ascii=False)
+        with open(os.path.join(path, FINGERPRINTS_FILE), "wb") as f:
+            self.fingerprints.tofile(f)
+        with open(os.path.join(path, REFS_FILE), "w", encoding="utf-8") as f:
+            json.dump({str(row): sids for row, sids in self.refs.items()}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        store = cls()
+        with open(os.path.join(path, SOURCES_FILE), "r", encoding="utf-8") as f:
+            for s in json.load(f):
+                store.intern_source(s)
+        offsets = array("q")
+        with open(os.path.join(path, OFFSETS_FILE), "rb") as f:
+            offsets.frombytes(f.read())
+        source_ids = array("i")
+        with open(os.path.join(path, SOURCE_IDS_FILE), "rb") as f:
+            source_ids.frombytes(f.read())
+        store._offsets = offsets
+        store._source_ids = source_ids
+        fp_path = os.path.join(path, FINGERPRINTS_FILE)
+        if os.path.exists(fp_path):
+            with open(fp_path, "rb") as f:
+                store.fingerprints.frombytes(f.read())
+        if len(store.fingerprints) != len(source_ids):
+            store.fingerprints = array("Q", [0] * len(source_ids))
+        refs_path = os.path.join(path, REFS_FILE)
+        if os.path.exists(refs_path):
+            with open(refs_path, "r", encoding="utf-8") as f:
+                store.refs = {int(row): sids for row, sids in json.load(f).items()}
+        text_path = os.path.join(path, TEXT_FILE)
+        if os.path.getsize(text_path) > 0:
+            with open(text_path, "rb") as f:
+                store._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return store
+
+
+class IndexSnapshot:
+    """One persisted build of the retriever: manifest, chunk store, vectors and FAISS index."""
+
+    def __init__(self, manifest: Dict, store: ChunkStore, vectors=None, index=None):
+        self.manifest = manifest
+        self.store = store
+        self.vectors = vectors
+        self.index = index
+
+    def doc_rows(self, source: str) -> Optional[Tuple[int, int]]:
+        doc = self.manifest.get("docs", {}).get(source)
+        if not doc:
+            return None
+        return int(doc["start"]), int(doc["end"])
+
+
+def _current_dir(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except Exception:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def load_snapshot(root: str) -> Optional[IndexSnapshot]:
+    path = _current_dir(root)
+    if path is None:
+        return None
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != STORE_VERSION:
+            return None
+        store = ChunkStore.load(path)
+    except Exception:
+        return None
+
+    vectors = None
+    vec_path = os.path.join(path, VECTORS_FILE)
+    if np is not None and os.path.exists(vec_path):
+        try:
+            vectors = np.load(vec_path, mmap_mode="r")
+        except Exception:
+            vectors = None
+
+    index = None
+    idx_path = os.path.join(path, INDEX_FILE)
+    if faiss is not None and os.path.exists(idx_path):
+        try:
+            index = faiss.read_index(idx_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            try:
+                index = faiss.read_index(idx_path)
+            except Exception:
+                index = None
+    return IndexSnapshot(manifest, store, vectors, index)
+
+
+def save_snapshot(root: str, snapshot: IndexSnapshot, keep: int = 2) -> str:
+    """Write a snapshot into a fresh versioned directory and atomically point CURRENT at it.
+
+    Concurrent writers (e.g. several uvicorn workers starting together) each
+    produce a complete directory, so readers never see a half-written build.
+    """
+    os.makedirs(root, exist_ok=True)
+    name = f"v-{uuid.uuid4().hex[:12]}"
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    snapshot.store.save(path)
+    if snapshot.vectors is not None and np is not None:
+        # keep the stored dtype: int8 when the retriever quantizes its vectors
+        np.save(os.path.join(path, VECTORS_FILE), np.ascontiguousarray(snapshot.vectors))
+    if snapshot.index is not None and faiss is not None:
+        faiss.write_index(snapshot.index, os.path.join(path, INDEX_FILE))
+    manifest = dict(snapshot.manifest)
+    manifest["version"] = STORE_VERSION
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    tmp = os.path.join(root, f"{CURRENT_FILE}.{name}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+    _prune(root, keep)
+    return path
+
+
+def _prune(root: str, keep: int):
+    try:
+        versions = [
+            os.path.join(root, d)
+            for d in os.listdir(root)
+            if d.startswith("v-") and os.path.isdir(os.path.join(root, d))
+        ]
+    except Exception:
+        return
+    current = _current_dir(root)
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[keep:]:
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.telemetry import prompt_hash
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a prompt."""
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    return _SPACE_RE.sub(" ", text).strip().rstrip("?!. ")
+
+
+def cache_key(prompt: str, backend: str, model: str) -> str:
+    return prompt_hash(f"{backend}\x00{model}\x00{normalize_prompt(prompt)}")
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of LLM replies.
+
+    With ``path`` set, entries are appended to a JSON-lines log and reloaded
+    on start. Log writes happen on a background thread, so ``get`` and
+    ``put`` never touch the disk. The log is rewritten with only live
+    entries at load time, and again whenever more than ``compact_ratio`` of
+    its lines are stale (overwritten, expired or evicted). Appends and
+    rewrites hold an exclusive lock on ``<path>.lock``, and a rewrite keeps
+    the latest live line of every key in the file, so workers sharing one
+    log do not drop each other's entries.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_s: float = 3600.0,
+        path: Optional[str] = None,
+        compact_ratio: float = 0.5,
+        compact_min_lines: int = 1000,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.path = path or None
+        self.compact_ratio = float(compact_ratio)
+        self.compact_min_lines = max(1, int(compact_min_lines))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.log_lines = 0
+        self.compactions = 0
+        self._kept_lines = 0  # lines left by the last rewrite (other workers' entries included)
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if self.path:
+            self._load()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any):
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._insert(key, expires, value)
+            if self.path:
+                self._pending.put(json.dumps({"k": key, "e": expires, "v": value}, ensure_ascii=False) + "\n")
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="ask-cache-log", daemon=True)
+                    self._writer.start()
+
+    def _insert(self, key: str, expires: float, value: Any):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # serializes appends and rewrites across processes sharing the log
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_loop(self):
+        while True:
+            lines = [self._pending.get()]
+            while True:
+                try:
+                    lines.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(lines)
+            except Exception:
+                pass
+            finally:
+                for _ in lines:
+                    self._pending.task_done()
+
+    def _append(self, lines: List[str]):
+        with self._file_lock():
+            # opened per batch, so appends land in the file a concurrent rewrite put in place
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            with self._lock:
+                self.log_lines += len(lines)
+                live = max(len(self._entries), self._kept_lines)
+                tight = self.log_lines >= self.compact_min_lines and self.log_lines - live > self.compact_ratio * self.log_lines
+            if tight:
+                self._rewrite_log()
+
+    def flush(self):
+        """Wait until every ``put`` so far is in the log (e.g. at shutdown)."""
+        if self.path:
+            self._pending.join()
+
+    def _read_log(self) -> "OrderedDict[str, tuple]":
+        """Latest live ``(expires, value)`` per key in the log, oldest first."""
+        now = time.time()
+        rows: "OrderedDict[str, tuple]" = OrderedDict()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except Exception:
+                    continue  # torn last line after a crash
+                rows.pop(row["k"], None)
+                if row.get("e", 0) > now:
+                    rows[row["k"]] = (row["e"], row["v"])
+        return rows
+
+    def _load(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._file_lock():
+                try:
+                    rows = self._read_log()
+                except FileNotFoundError:
+                    rows = OrderedDict()
+                for key, (expires, value) in rows.items():
+                    self._insert(key, expires, value)
+                self.evictions = 0
+                self._rewrite_log(rows)
+        except Exception:
+            return
+
+    def _rewrite_log(self, rows: "Optional[OrderedDict[str, tuple]]" = None):
+        # Caller holds the file lock. Live lines of every writer, newest max_entries kept, swapped in atomically.
+        try:
+            if rows is None:
+                rows = self._read_log()
+            keep = list(rows.items())[-self.max_entries:]
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp = tempfile.mkstemp(prefix=".ask_cache.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    for key, (expires, value) in keep:
+                        f.write(json.dumps({"k": key, "e": expires, "v": value}, ensure_ascii=False) + "\n")
+                os.replace(tmp, self.path)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            with self._lock:
+                self.log_lines = self._kept_lines = len(keep)
+                self.compactions += 1
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "log_lines": self.log_lines,
+                "compactions": self.compactions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
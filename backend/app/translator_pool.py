@@ -0,0 +1,141 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from app import kiswahili_local_model
+
+
+def _init_worker(threads: int):
+    # one intra-op thread per worker by default: workers x threads should not exceed the cores
+    kiswahili_local_model._import_torch()
+    torch = kiswahili_local_model.torch
+    torch.set_num_threads(max(1, threads))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set in this process
+    kiswahili_local_model.warm()
+
+
+def _worker_translate(texts: List[str], options: Dict[str, Any]) -> List[str]:
+    return kiswahili_local_model.translate_batch(texts, **options)
+
+
+def _worker_ready() -> bool:
+    return kiswahili_local_model.is_loaded()
+
+
+class TranslatorPool:
+    """Spreads translation batches across worker processes, each with pinned torch threads.
+
+    Every worker loads the translator once at spawn. A request's sentences
+    are split into chunks (at least ``min_chunk`` each) so a large batch
+    uses several workers, while small requests go to a single one. With
+    ``workers=0`` translation runs in this process on a thread instead.
+    """
+
+    def __init__(self, workers: int = 0, threads: int = 1, min_chunk: int = 16):
+        self.workers = max(0, int(workers))
+        self.threads = max(1, int(threads))
+        self.min_chunk = max(1, int(min_chunk))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.sentences = 0
+        self.errors = 0
+        self.restarts = 0
+
+    @classmethod
+    def from_env(cls) -> "TranslatorPool":
+        threads = int(os.environ.get("K_SASA_TRANSLATE_THREADS", "1"))
+        workers = os.environ.get("K_SASA_TRANSLATE_WORKERS", "0").strip().lower()
+        if workers == "auto":
+            workers = str(max(1, (os.cpu_count() or 1) // max(1, threads)))
+        return cls(
+            workers=int(workers or 0),
+            threads=threads,
+            min_chunk=int(os.environ.get("K_SASA_TRANSLATE_MIN_CHUNK", "16")),
+        )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that already holds torch threads can deadlock
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.threads,),
+                    )
+        return self._executor
+
+    def _reset(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self) -> bool:
+        """Start every worker and load the model in each (blocking)."""
+        if not self.workers:
+            return kiswahili_local_model.warm()
+        executor = self.executor
+        try:
+            # concurrent submissions keep each worker busy, so all of them get spawned
+            futures = [executor.submit(_worker_ready) for _ in range(self.workers)]
+            return all(f.result() for f in futures)
+        except BrokenProcessPool:
+            self._reset(executor)
+            return False
+
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        size = max(self.min_chunk, math.ceil(len(texts) / max(1, self.workers)))
+        return [texts[i : i + size] for i in range(0, len(texts), size)]
+
+    async def translate(self, texts: List[str], **options) -> List[str]:
+        """Translate ``texts`` in order; options are passed to ``translate_batch``."""
+        self.requests += 1
+        self.sentences += len(texts)
+        if not texts:
+            return []
+        try:
+            if not self.workers:
+                return await asyncio.to_thread(kiswahili_local_model.translate_batch, texts, **options)
+            executor = self.executor
+            loop = asyncio.get_running_loop()
+            try:
+                parts = await asyncio.gather(
+                    *(loop.run_in_executor(executor, _worker_translate, chunk, options) for chunk in self._chunks(texts))
+                )
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM-killed); the next request gets a fresh pool
+                self._reset(executor)
+                raise
+            return [out for part in parts for out in part]
+        except Exception:
+            self.errors += 1
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "threads": self.threads,
+            "requests": self.requests,
+            "sentences": self.sentences,
+            "errors": self.errors,
+            "restarts": self.restarts,
+        }
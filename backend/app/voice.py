@@ -1,9 +1,27 @@
 import base64
+import hashlib
+import io
+import json
 import os
+import subprocess
+import threading
 import uuid
+import wave
 from typing import Optional
+from urllib.parse import urlparse
 
 from app.audit import write_audit
+from app.whisper_registry import WhisperRegistry
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header  # type: ignore
+except Exception:  # pragma: no cover
+    try:
+        from multipart.multipart import MultipartParser, parse_options_header  # type: ignore
+    except Exception:
+        MultipartParser = None  # type: ignore
+
+whisper_models = WhisperRegistry.from_env()
 
 
 def _static_dir() -> str:
@@ -17,58 +35,301 @@ def _static_url(filename: str) -> str:
     return f"/static/{filename}"
 
 
-def transcribe(audio_base64: Optional[str], audio_url: Optional[str], language: str = "sw") -> tuple[str, float]:
+def whisper_model_name(requested: Optional[str] = None) -> str:
+    """``requested`` if it is one of K_SASA_WHISPER_MODELS, else K_SASA_WHISPER_MODEL."""
+    default = os.environ.get("K_SASA_WHISPER_MODEL", "base")
+    allowed = [m.strip() for m in os.environ.get("K_SASA_WHISPER_MODELS", default).split(",") if m.strip()]
+    return requested if requested in allowed else default
+
+
+def warm_stt() -> bool:
+    if os.environ.get("K_SASA_STT", "stub").lower() != "whisper":
+        return False
+    return whisper_models.preload([whisper_model_name()])
+
+
+class AudioTooLarge(ValueError):
+    pass
+
+
+def max_audio_bytes() -> int:
+    return int(os.environ.get("K_SASA_STT_MAX_BYTES", str(25 * 1024 * 1024)))
+
+
+class MultipartAudio:
+    """Collects the ``file`` part of a multipart/form-data body in memory as it streams in.
+
+    Only that part's bytes are kept (other parts are skipped), and more
+    than ``limit`` of them raises AudioTooLarge; nothing is spooled to disk.
+    """
+
+    def __init__(self, content_type: str, limit: int):
+        if MultipartParser is None:
+            raise ValueError("multipart uploads need python-multipart; send the raw audio body instead")
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("multipart upload without a boundary")
+        self.limit = limit
+        self.data = bytearray()
+        self.found = False
+        self._in_file = False
+        self._field = b""
+        self._value = b""
+        self._headers: dict = {}
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._part_begin,
+                "on_header_field": self._header_field,
+                "on_header_value": self._header_value,
+                "on_header_end": self._header_end,
+                "on_headers_finished": self._headers_finished,
+                "on_part_data": self._part_data,
+            },
+        )
+
+    def _part_begin(self):
+        self._headers = {}
+        self._in_file = False
+
+    def _header_field(self, buf, start, end):
+        self._field += buf[start:end]
+
+    def _header_value(self, buf, start, end):
+        self._value += buf[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def _headers_finished(self):
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = params.get(b"name") == b"file" and not self.found
+        self.found = self.found or self._in_file
+
+    def _part_data(self, buf, start, end):
+        if self._in_file:
+            self.data += buf[start:end]
+
+    def feed(self, chunk: bytes):
+        self._parser.write(chunk)
+        if len(self.data) > self.limit:
+            raise AudioTooLarge(f"audio larger than {self.limit} bytes")
+
+    def finish(self) -> bytes:
+        self._parser.finalize()
+        if not self.found:
+            raise ValueError("multipart upload needs a 'file' part")
+        return bytes(self.data)
+
+
+_http = None
+
+
+def _session():
+    # pooled keep-alive connections for audio URL downloads
+    global _http
+    if _http is None:
+        import requests  # type: ignore
+        from requests.adapters import HTTPAdapter  # type: ignore
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=int(os.environ.get("K_SASA_STT_FETCH_POOL", "16")))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http = session
+    return _http
+
+
+def fetch_audio(url: str) -> bytes:
+    """Download ``url`` in chunks, refusing bodies over K_SASA_STT_MAX_BYTES."""
+    if urlparse(url).scheme not in ("http", "https"):
+        raise ValueError(f"unsupported audio URL scheme: {url}")
+    limit = max_audio_bytes()
+    timeout = float(os.environ.get("K_SASA_STT_FETCH_TIMEOUT", "15"))
+    with _session().get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        declared = r.headers.get("Content-Length", "")
+        if declared.isdigit() and int(declared) > limit:
+            raise AudioTooLarge(f"audio larger than {limit} bytes")
+        buf = bytearray()
+        for chunk in r.iter_content(chunk_size=64 * 1024):
+            buf += chunk
+            if len(buf) > limit:
+                raise AudioTooLarge(f"audio larger than {limit} bytes")
+    return buf
+
+
+def _wav_pcm16(data: bytes) -> Optional[bytes]:
+    # 16 kHz mono 16-bit WAV is what Whisper wants; read it without ffmpeg
+    try:
+        with wave.open(io.BytesIO(data)) as wf:
+            if wf.getnchannels() == 1 and wf.getsampwidth() == 2 and wf.getframerate() == 16000:
+                return wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError):
+        pass
+    return None
+
+
+def _ffmpeg_pcm16(data: bytes) -> bytes:
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0"]
+    cmd += ["-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", "16000", "pipe:1"]
+    return subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+
+
+def decode_audio(data: bytes):
+    """Decode any audio container to 16 kHz mono float32 samples in memory (ffmpeg via pipes)."""
+    import numpy as np
+
+    pcm = _wav_pcm16(data)
+    if pcm is None:
+        pcm = _ffmpeg_pcm16(data)
+    audio = np.frombuffer(pcm, np.int16).astype(np.float32)
+    audio *= 1.0 / 32768.0
+    return audio
+
+
+def _audio_bytes(audio_base64: Optional[str], audio_url: Optional[str], audio_bytes: Optional[bytes]) -> bytes:
+    limit = max_audio_bytes()
+    if audio_bytes is not None:
+        data = audio_bytes
+    elif audio_base64:
+        if len(audio_base64) // 4 * 3 > limit:
+            raise AudioTooLarge(f"audio larger than {limit} bytes")
+        data = base64.b64decode(audio_base64)
+    elif audio_url:
+        data = fetch_audio(audio_url)
+    else:
+        raise ValueError("no audio")
+    if len(data) > limit:
+        raise AudioTooLarge(f"audio larger than {limit} bytes")
+    return data
+
+
+def transcribe(
+    audio_base64: Optional[str],
+    audio_url: Optional[str],
+    language: str = "sw",
+    model: Optional[str] = None,
+    audio_bytes: Optional[bytes] = None,
+) -> tuple[str, float]:
+    """Transcribe base64 audio, an audio URL or raw ``audio_bytes``; raises AudioTooLarge over the size limit."""
     engine = os.environ.get("K_SASA_STT", "stub").lower()
     if engine != "whisper":
         return "(stub) sauti imetambuliwa vizuri", 0.5
     try:
-        import whisper  # type: ignore
-        import requests  # type: ignore
-        import tempfile
-
-        model_name = os.environ.get("K_SASA_WHISPER_MODEL", "base")
-        model = whisper.load_model(model_name)
-        # prepare temp file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            tmp_path = tmp.name
-            if audio_base64:
-                data = base64.b64decode(audio_base64)
-                tmp.write(data)
-            elif audio_url:
-                r = requests.get(audio_url)
-                r.raise_for_status()
-                tmp.write(r.content)
-        result = model.transcribe(tmp_path, language=language)
+        audio = decode_audio(_audio_bytes(audio_base64, audio_url, audio_bytes))
+        with whisper_models.use(whisper_model_name(model)) as whisper_model:
+            result = whisper_model.transcribe(audio, language=language)
         text = result.get("text", "") or ""
         return text.strip() or "(empty)", 0.7
+    except AudioTooLarge:
+        raise
     except Exception:
         return "(stub) sauti imetambuliwa vizuri", 0.5
 
 
-def synthesize(text: str, language: str = "sw", voice: Optional[str] = None) -> str:
+_coqui_engines: dict = {}
+_coqui_lock = threading.Lock()
+# striped locks so concurrent requests for the same phrase synthesize it once
+_tts_locks = [threading.Lock() for _ in range(64)]
+tts_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _coqui(model_name: str):
+    """(engine, lock) for ``model_name``; the engine is created once and used by one request at a time."""
+    with _coqui_lock:
+        entry = _coqui_engines.get(model_name)
+        if entry is None:
+            from TTS.api import TTS  # type: ignore
+
+            entry = _coqui_engines[model_name] = (TTS(model_name), threading.Lock())
+    return entry
+
+
+def _tts_model() -> str:
     engine = os.environ.get("K_SASA_TTS", "stub").lower()
     if engine != "coqui":
-        # Write a tiny silent wav as placeholder
-        import wave, struct
-
-        filename = f"tts-{uuid.uuid4()}.wav"
-        filepath = os.path.join(_static_dir(), filename)
-        with wave.open(filepath, "w") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(16000)
-            for _ in range(16000):
-                wf.writeframes(struct.pack('<h', 0))
-        return _static_url(filename)
+        return "stub"
+    return "coqui:" + os.environ.get("K_SASA_COQUI_MODEL", "tts_models/en/ljspeech/tacotron2-DDC")
+
+
+def tts_key(text: str, model: str, options: dict) -> str:
+    payload = json.dumps([text, model, sorted(options.items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def _engine_options(model: str, language: str, voice: Optional[str]) -> dict:
+    """The request options ``model`` actually honors; only these are passed to it and keyed on."""
+    if model == "stub":
+        return {}
+    tts, _ = _coqui(model.split(":", 1)[1])
+    options = {}
+    if voice and getattr(tts, "is_multi_speaker", False):
+        options["speaker"] = voice
+    if language and getattr(tts, "is_multi_lingual", False):
+        options["language"] = language
+    return options
+
+
+def warm_tts() -> bool:
+    model = _tts_model()
+    if model == "stub":
+        return False
     try:
-        from TTS.api import TTS  # type: ignore
+        _coqui(model.split(":", 1)[1])
+    except Exception:
+        return False
+    return True
 
-        model_name = os.environ.get("K_SASA_COQUI_MODEL", "tts_models/en/ljspeech/tacotron2-DDC")
-        tts = TTS(model_name)
-        filename = f"tts-{uuid.uuid4()}.wav"
-        filepath = os.path.join(_static_dir(), filename)
-        tts.tts_to_file(text=text, file_path=filepath)
-        return _static_url(filename)
+
+def _write_silence(filepath: str):
+    # Placeholder audio: one second of 16 kHz mono silence
+    with wave.open(filepath, "w") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(b"\x00\x00" * 16000)
+
+
+def _render(text: str, model: str, options: dict, filepath: str):
+    if model == "stub":
+        _write_silence(filepath)
+        return
+    tts, lock = _coqui(model.split(":", 1)[1])
+    with lock:
+        tts.tts_to_file(text=text, file_path=filepath, **options)
+
+
+def synthesize(text: str, language: str = "sw", voice: Optional[str] = None) -> str:
+    """URL of the audio for ``text``; files are named by a hash of (text, model, options used) and reused."""
+    model = _tts_model()
+    try:
+        return _cached_audio(text, language, voice, model)
     except Exception:
         # fallback to stub file
-        return synthesize(text, language, voice=None)
+        return _cached_audio(text, language, voice, "stub")
+
+
+def _cached_audio(text: str, language: str, voice: Optional[str], model: str) -> str:
+    options = _engine_options(model, language, voice)
+    key = tts_key(text, model, options)
+    filename = f"tts-{key}.wav"
+    filepath = os.path.join(_static_dir(), filename)
+    if os.path.exists(filepath):
+        tts_cache_stats["hits"] += 1
+        return _static_url(filename)
+    with _tts_locks[int(key[:8], 16) % len(_tts_locks)]:
+        if not os.path.exists(filepath):
+            tts_cache_stats["misses"] += 1
+            tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+            try:
+                _render(text, model, options, tmp_path)
+                os.replace(tmp_path, filepath)  # never serve a half-written file
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        else:
+            tts_cache_stats["hits"] += 1
+    return _static_url(filename)
@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Warmup:
+    """Load heavy components one after another on a background thread.
+
+    Each step returns True when its component is warm, or False when it was
+    unavailable and requests keep using the fallback path. Until a step has
+    run, requests use the fallback path too.
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[], bool]]] = []
+        self.components: Dict[str, Dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def add(self, name: str, fn: Callable[[], bool]):
+        self.steps.append((name, fn))
+        self.components[name] = {"status": "pending"}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+                self._thread.start()
+
+    def run(self):
+        for name, fn in self.steps:
+            self.components[name] = {"status": "loading"}
+            t0 = time.time()
+            try:
+                status = "ready" if fn() is not False else "fallback"
+                error = None
+            except Exception as exc:
+                status, error = "failed", str(exc)
+            entry = {"status": status, "seconds": round(time.time() - t0, 2)}
+            if error:
+                entry["error"] = error
+            self.components[name] = entry
+        self._done.set()
+
+    def skip(self):
+        """Mark every step skipped and report ready without loading anything (tests)."""
+        for name, _ in self.steps:
+            self.components[name] = {"status": "skipped"}
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def snapshot(self) -> Dict:
+        return {
+            "ready": self.done,
+            "components": {
+                name: {**entry, "warm": entry["status"] == "ready"} for name, entry in self.components.items()
+            },
+        }
@@ -0,0 +1,147 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+def load_whisper(name: str):
+    import whisper  # type: ignore
+
+    return whisper.load_model(name, download_root=os.environ.get("K_SASA_WHISPER_DIR") or None)
+
+
+def model_nbytes(model) -> int:
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("model", "nbytes", "lock", "users")
+
+    def __init__(self, model, nbytes: int):
+        self.model = model
+        self.nbytes = nbytes
+        self.lock = threading.Lock()  # one transcription at a time per model
+        self.users = 0
+
+
+class WhisperRegistry:
+    """Process-wide cache of loaded Whisper models, keyed by model name.
+
+    Each model is loaded once; concurrent first requests wait for the same
+    load. Least-recently-used models are evicted while more than
+    ``max_models`` or ``max_mb`` of weights are resident, but never while a
+    request is using them. A model runs one transcription at a time, because
+    whisper's decoder installs KV-cache hooks on the shared module.
+    """
+
+    def __init__(self, max_models: int = 2, max_mb: float = 4096.0, loader: Callable[[str], Any] = load_whisper):
+        self.max_models = max(1, int(max_models))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._loader = loader
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "WhisperRegistry":
+        return cls(
+            max_models=int(os.environ.get("K_SASA_WHISPER_CACHE_MODELS", "2")),
+            max_mb=float(os.environ.get("K_SASA_WHISPER_CACHE_MB", "4096")),
+        )
+
+    def _claim(self, name: str) -> Optional[_Entry]:
+        # caller holds self._lock
+        entry = self._entries.get(name)
+        if entry is not None:
+            self._entries.move_to_end(name)
+            entry.users += 1
+            self.hits += 1
+        return entry
+
+    def _acquire(self, name: str) -> _Entry:
+        with self._lock:
+            entry = self._claim(name)
+            if entry is not None:
+                return entry
+            load_lock = self._loading.setdefault(name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._claim(name)
+                if entry is not None:
+                    return entry
+            try:
+                model = self._loader(name)
+            except Exception:
+                with self._lock:
+                    self._loading.pop(name, None)
+                raise
+            entry = _Entry(model, model_nbytes(model))
+            with self._lock:
+                entry.users = 1
+                self._entries[name] = entry
+                self._loading.pop(name, None)
+                self.nbytes += entry.nbytes
+                self.loads += 1
+                self._shrink()
+        return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.users -= 1
+            self._shrink()
+
+    def _shrink(self):
+        # caller holds self._lock; oldest first, skipping models in use
+        for name in list(self._entries):
+            if len(self._entries) <= self.max_models and self.nbytes <= self.max_bytes:
+                break
+            entry = self._entries[name]
+            if entry.users:
+                continue
+            del self._entries[name]
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Hold model ``name`` (loading it if needed) for one transcription."""
+        entry = self._acquire(name)
+        try:
+            with entry.lock:
+                yield entry.model
+        finally:
+            self._release(entry)
+
+    def preload(self, names: List[str]) -> bool:
+        try:
+            for name in names:
+                entry = self._acquire(name)
+                self._release(entry)
+        except Exception:
+            return False
+        return True
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": {
+                    name: {"mb": round(e.nbytes / (1024 * 1024), 1), "in_use": e.users}
+                    for name, e in self._entries.items()
+                },
+                "mb": round(self.nbytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
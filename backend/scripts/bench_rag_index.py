@@ -0,0 +1,158 @@
+"""Recall/latency benchmark of the retriever's ANN index types against the exact flat index.
+
+Usage (from backend/):
+    python scripts/bench_rag_index.py --index-dir /app/index --k 4
+    python scripts/bench_rag_index.py --index-dir /app/index --domain health
+    python scripts/bench_rag_index.py --synthetic 200000 --dim 384 --types ivf_flat,hnsw,ivf_pq
+
+Vectors come from persisted retriever snapshots or are generated
+synthetically. --index-dir is the K_SASA_INDEX_DIR root: each domain
+partition (<root>/<domain>) is benchmarked separately, or just --domain;
+a directory holding a single snapshot also works. Queries are perturbed copies of stored vectors,
+searched one at a time as on the serving path. Tuning follows the same
+K_SASA_RAG_* environment variables as the server, or --nprobe/--ef-search.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.ann import INDEX_TYPES, ann_params, build_ann_index, dequantize_vectors, resolve_index_type  # noqa: E402
+from app.rag_store import load_snapshot  # noqa: E402
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (x / norms).astype("float32")
+
+
+def _snapshot_vectors(path):
+    snapshot = load_snapshot(path)
+    if snapshot is None or snapshot.vectors is None:
+        return None
+    # sq8/pq stores keep int8 codes on disk; benchmark the vectors they stand for
+    return dequantize_vectors(snapshot.vectors)
+
+
+def _load_vectors(args):
+    """``[(label, vectors)]``: one entry per domain partition, or the synthetic set."""
+    if args.index_dir:
+        if args.domain:
+            paths = [(args.domain, os.path.join(args.index_dir, args.domain))]
+        elif _snapshot_vectors(args.index_dir) is not None:
+            paths = [(os.path.basename(os.path.normpath(args.index_dir)), args.index_dir)]
+        else:
+            paths = [
+                (name, os.path.join(args.index_dir, name))
+                for name in sorted(os.listdir(args.index_dir))
+                if os.path.isdir(os.path.join(args.index_dir, name))
+            ]
+        found = [(label, v) for label, v in ((label, _snapshot_vectors(p)) for label, p in paths) if v is not None]
+        if not found:
+            sys.exit(f"No persisted vectors found under {args.index_dir}")
+        return found
+    rng = np.random.default_rng(args.seed)
+    # Clustered data is closer to real embeddings than uniform noise
+    centers = rng.standard_normal((max(1, args.synthetic // 100), args.dim))
+    assign = rng.integers(0, len(centers), size=args.synthetic)
+    return [("synthetic", _normalize(centers[assign] + 0.3 * rng.standard_normal((args.synthetic, args.dim))))]
+
+
+def _search_each(index, queries, k):
+    ids = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, found = index.search(queries[i : i + 1], k)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        ids[i] = found[0]
+    return ids, np.asarray(latencies)
+
+
+def _recall(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k]) - {-1}) for f, t in zip(found, truth))
+    return hits / float(len(truth) * k)
+
+
+def _bench(vectors, args, params):
+    n, dim = vectors.shape
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(n, size=min(args.queries, n), replace=False)
+    queries = _normalize(vectors[picks] + 0.05 * rng.standard_normal((len(picks), dim)))
+    ids = np.arange(n, dtype="int64")
+
+    exact = build_ann_index(vectors, ids, "flat", params)
+    truth, _ = _search_each(exact, queries, args.k)
+
+    results = []
+    for requested in [t.strip() for t in args.types.split(",") if t.strip()]:
+        if requested not in INDEX_TYPES:
+            print(f"skipping unknown index type {requested!r}", file=sys.stderr)
+            continue
+        kind = resolve_index_type(requested, n, params)
+        t0 = time.perf_counter()
+        index = build_ann_index(vectors, ids, kind, params)
+        build_s = time.perf_counter() - t0
+        found, lat = _search_each(index, queries, args.k)
+        results.append({
+            "index_type": kind,
+            "requested": requested,
+            "vectors": n,
+            "build_s": round(build_s, 2),
+            f"recall@{args.k}": round(_recall(found, truth, args.k), 4),
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        })
+    return len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=None, help="K_SASA_INDEX_DIR root (or one snapshot directory)")
+    parser.add_argument("--domain", default=None, help="only benchmark this domain partition")
+    parser.add_argument("--synthetic", type=int, default=100000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", default="flat,ivf_flat,hnsw,ivf_pq")
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    params = ann_params()
+    if args.nprobe is not None:
+        params["nprobe"] = args.nprobe
+    if args.ef_search is not None:
+        params["ef_search"] = args.ef_search
+
+    runs = []
+    for label, vectors in _load_vectors(args):
+        n_queries, results = _bench(vectors, args, params)
+        runs.append((label, vectors.shape, n_queries, results))
+
+    if args.json:
+        print(json.dumps({"params": params, "results": {label: results for label, _, _, results in runs}}, indent=2))
+        return
+    for label, (n, dim), n_queries, results in runs:
+        print(
+            f"[{label}] {n} vectors, dim {dim}, {n_queries} queries, "
+            f"nprobe={params['nprobe']} efSearch={params['ef_search']}"
+        )
+        print(f"{'index':<10} {'build_s':>8} {'recall@' + str(args.k):>10} {'p50_ms':>8} {'p99_ms':>8}")
+        for r in results:
+            print(
+                f"{r['index_type']:<10} {r['build_s']:>8} {r[f'recall@{args.k}']:>10} "
+                f"{r['p50_ms']:>8} {r['p99_ms']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Latency/throughput/agreement benchmark of the local Kiswahili translator variants.
+
+Usage (from backend/):
+    python scripts/bench_translator.py --export --save
+    python scripts/bench_translator.py --input sentences.txt --variants eager,quantized --threads 1
+
+Variants: eager (float32 modules), quantized (dynamic int8 GRU/Linear),
+scripted and scripted_int8 (TorchScript, loaded from files written by
+--export next to model.pt). Single-sentence latency is measured one call at
+a time as on /generate; throughput uses translate_batch. Agreement is the
+share of outputs identical to eager. --save writes translator_bench.json,
+which the server reads with K_SASA_TRANSLATE_VARIANT=auto to serve the
+fastest variant whose agreement is at least K_SASA_TRANSLATE_MIN_AGREEMENT.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ["K_SASA_TRANSLATE_VARIANT"] = "eager"  # baseline for agreement
+
+from app import kiswahili_local_model as kiswahili  # noqa: E402
+
+
+def _sentences(args):
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    words = [w for w in kiswahili._src_stoi if not w.startswith("<")]
+    rng = random.Random(args.seed)
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(2, 8))) for _ in range(args.sentences)]
+
+
+def _bench(variant, sentences, args):
+    kiswahili.use_variant(variant)
+    kiswahili.translate_batch(sentences[:8], beam_size=args.beam)  # warm-up
+    latencies = []
+    for text in sentences[: args.single]:
+        t0 = time.perf_counter()
+        kiswahili.translate(text, beam_size=args.beam)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    t0 = time.perf_counter()
+    outputs = kiswahili.translate_batch(sentences, beam_size=args.beam, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - t0
+    lat = np.asarray(latencies)
+    return outputs, {
+        "variant": variant,
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "sentences_per_s": round(len(sentences) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=None, help="file with one Swahili sentence per line")
+    parser.add_argument("--sentences", type=int, default=2000, help="number of synthetic sentences")
+    parser.add_argument("--single", type=int, default=300, help="sentences timed one at a time")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--beam", type=int, default=1)
+    parser.add_argument("--variants", default=",".join(kiswahili.VARIANTS))
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--export", action="store_true", help="write TorchScript artifacts first")
+    parser.add_argument("--save", action="store_true", help=f"write {kiswahili.BENCH_MANIFEST} for the server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    kiswahili._load_model()
+    torch = kiswahili.torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.export:
+        for variant, paths in kiswahili.export_artifacts().items():
+            print(f"exported {variant}: {', '.join(paths)}", file=sys.stderr)
+
+    sentences = _sentences(args)
+    reference = None
+    results = []
+    for variant in [v.strip() for v in args.variants.split(",") if v.strip()]:
+        if variant not in kiswahili.VARIANTS:
+            print(f"skipping unknown variant {variant!r}", file=sys.stderr)
+            continue
+        if reference is None and variant != "eager":
+            reference, _ = _bench("eager", sentences, args)
+        outputs, row = _bench(variant, sentences, args)
+        if reference is None:
+            reference = outputs
+        row["agreement"] = round(sum(a == b for a, b in zip(outputs, reference)) / float(len(sentences)), 4)
+        results.append(row)
+
+    manifest = {
+        "checkpoint": kiswahili.checkpoint_fingerprint(),
+        "torch": torch.__version__,
+        "threads": torch.get_num_threads(),
+        "beam": args.beam,
+        "sentences": len(sentences),
+        "results": results,
+    }
+    if args.save:
+        path = os.path.join(kiswahili.model_dir(), kiswahili.BENCH_MANIFEST)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        print(f"wrote {path}", file=sys.stderr)
+    if args.json:
+        print(json.dumps(manifest, indent=2))
+        return
+    print(f"{len(sentences)} sentences, beam {args.beam}, {manifest['threads']} threads, torch {manifest['torch']}")
+    print(f"{'variant':<14} {'p50_ms':>8} {'p99_ms':>8} {'sent/s':>9} {'agree':>7}")
+    for r in results:
+        print(
+            f"{r['variant']:<14} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+            f"{r['sentences_per_s']:>9} {r['agreement']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()